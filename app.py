@@ -1,20 +1,32 @@
 import streamlit as st
-import firebase_admin
-from firebase_admin import credentials, auth, firestore
-from openai import OpenAI
+import streamlit.components.v1 as components
+from firebase_admin import firestore
 from datetime import datetime
 import pytz
-import requests
+import json
+import time
+import re
+import asyncio
+import openai
+from functools import partial
+from collections import OrderedDict
 
 # Import configurations
 from initial import INITIAL_ASSISTANT_MESSAGE
-from reviewprocess import MODULE_LEARNING_OBJECTIVES, MODULE_SYLLABUS, SYSTEM_INSTRUCTIONS, REVIEW_INSTRUCTIONS, DISCLAIMER, SCORING_CRITERIA
+from reviewprocess import DISCLAIMER
+from prompts import build_context, is_review_request, is_scoring_request, SYSTEM_MESSAGES, REVIEW_MODE_MESSAGE
+from store import persist_turn_async, conversation_stats
+from reviewcache import find_essay
+from metrics import StageTimer, record_metrics, usage_dict
+from resources import (get_db, get_async_db, get_async_openai, get_async_bridge, get_identity,
+                       get_governor, get_title_worker, get_review_cache, get_review_engine)
+from governor import request_tokens
 
-# Initialize Firebase
-if not firebase_admin._apps:
-    cred = credentials.Certificate(dict(st.secrets["FIREBASE"]))
-    firebase_admin.initialize_app(cred)
-db = firestore.client()
+# Shared Firestore client, created once per process
+db = get_db()
+
+REMEMBER_COOKIE = "ewa_refresh_token"  # Refresh token for "Keep me signed in"
+REMEMBER_DAYS = 30
 
 # Page setup
 st.set_page_config(page_title="DUTE Essay Writing Assistant", layout="wide")
@@ -30,6 +42,22 @@ class EWA:
     def __init__(self):        
         self.tz = pytz.timezone("Europe/London")
         self.conversations_per_page = 10  # Number of conversations per page
+        self.stream_responses = True  # Render replies token-by-token
+        self.chat_token_budget = 8000     # Estimated prompt tokens for regular chat
+        self.review_token_budget = 24000  # Estimated prompt tokens for review tasks
+        self.parallel_reviews = True  # Score each rubric area concurrently
+        self.cached_conversations = 20  # Conversations kept in the session cache
+        self.sidebar_ttl = 60  # Seconds a cached sidebar page is reused
+        self.visible_messages = 20  # Messages rendered per window; earlier ones load on request
+        self.collapse_chars = 2000  # Longer messages show a preview until expanded
+        self.preview_chars = 500    # Length of that preview
+
+        # Shared clients; the async ones are only used on the async bridge loop
+        self.async_client = get_async_openai()
+        self.async_db = get_async_db()
+        self.review_cache = get_review_cache()
+        self.review_engine = get_review_engine()
+        self.governor = get_governor()
 
 
     def format_time(self, dt=None):
@@ -40,22 +68,111 @@ class EWA:
         return dt.strftime("[%Y-%m-%d %H:%M:%S]")           
 
     def get_conversations(self, user_id):
-        """Retrieve conversation history from Firestore"""
-        # Get total conversation count
-        count = len(list(db.collection('conversations')
-                        .where('user_id', '==', user_id)
-                        .stream()))
-    
-        # Calculate start position based on current page
+        """Retrieve one page of conversation history, cached per user and page.
+
+        Pages are walked with cursors kept in st.session_state.page_cursors, where
+        entry i is the (updated_at, id) position page i starts after. One extra
+        document is fetched to tell whether another page follows. Pages are kept
+        for sidebar_ttl seconds and patched in place by record_turn, so most
+        reruns do not touch Firestore.
+        """
         page = st.session_state.get('page', 0)
-        start = page * 10
-    
-        return db.collection('conversations')\
-                 .where('user_id', '==', user_id)\
-                 .order_by('updated_at', direction=firestore.Query.DESCENDING)\
-                 .offset(start)\
-                 .limit(10)\
-                 .stream(), count > (start + 10)
+        cursors = st.session_state.get('page_cursors', [])
+        if page > len(cursors):
+            page = st.session_state.page = 0
+
+        cache = st.session_state.setdefault('sidebar_cache', {})
+        entry = cache.get((user_id, page))
+        if entry and time.monotonic() - entry['fetched_at'] < self.sidebar_ttl:
+            return entry['conversations'], entry['has_more']
+
+        query = db.collection('conversations')\
+                  .where('user_id', '==', user_id)\
+                  .order_by('updated_at', direction=firestore.Query.DESCENDING)\
+                  .order_by('__name__', direction=firestore.Query.DESCENDING)
+        if page > 0:
+            query = query.start_after(cursors[page - 1])
+
+        docs = list(query.limit(self.conversations_per_page + 1).stream())
+        conversations = [{**doc.to_dict(), 'id': doc.id} for doc in docs[:self.conversations_per_page]]
+        has_more = len(docs) > self.conversations_per_page
+        cache[(user_id, page)] = {'conversations': conversations, 'has_more': has_more,
+                                  'fetched_at': time.monotonic()}
+        return conversations, has_more
+
+    def patch_sidebar_cache(self, turn):
+        """Move the turn's conversation to the top of the cached first page.
+
+        Its count, snippets and updated_at are patched in place; later pages
+        and the cursors they start after have shifted, so both are dropped and
+        the pages refetched from the first one when next shown.
+        """
+        st.session_state.page_cursors = []  # get_conversations falls back to page 0
+        cache = st.session_state.get('sidebar_cache')
+        if not cache:
+            return
+
+        user_id = turn['user_id']
+        for key in [key for key in cache if key[0] == user_id and key[1] > 0]:
+            del cache[key]
+        first = cache.get((user_id, 0))
+        if not first:
+            return
+
+        conversations = first['conversations']
+        current = next((conv for conv in conversations if conv['id'] == turn['conversation_id']), None)
+        if current:
+            conversations.remove(current)
+        else:
+            current = {'id': turn['conversation_id'],
+                       'title': f"{turn['date'].strftime('%b %d, %Y')} • New Chat [0📝]"}
+            if len(conversations) >= self.conversations_per_page:
+                conversations.pop()
+                first['has_more'] = True
+
+        count = turn['stats']['message_count']
+        current.update({
+            'updated_at': datetime.now(self.tz),
+            'message_count': count,
+            'recent_messages': turn['stats']['recent_messages'],
+            'title': re.sub(r"\[\d+📝\]$", f"[{count}📝]", current.get('title') or 'Untitled')
+        })
+        conversations.insert(0, current)
+
+    def count_conversations(self, user_id):
+        """Total conversations for the user, counted server-side once per session"""
+        if 'conversation_count' not in st.session_state:
+            result = db.collection('conversations')\
+                       .where('user_id', '==', user_id)\
+                       .count()\
+                       .get()
+            st.session_state.conversation_count = result[0][0].value
+        return st.session_state.conversation_count
+
+    def load_conversation(self, conversation_id):
+        """Load a conversation's messages through the per-session conversation cache.
+
+        Only messages newer than the cached copy's last timestamp are fetched;
+        the least recently opened conversations are evicted beyond the limit.
+        """
+        cache = st.session_state.setdefault('conversation_cache', OrderedDict())
+        entry = cache.pop(conversation_id, None) or {'messages': [], 'last_timestamp': None}
+
+        query = db.collection('conversations').document(conversation_id).collection('messages')
+        if entry['last_timestamp'] is not None:
+            query = query.where('timestamp', '>', entry['last_timestamp'])
+
+        for msg in query.order_by('timestamp').stream():
+            msg_dict = msg.to_dict()
+            if 'timestamp' in msg_dict:
+                entry['last_timestamp'] = msg_dict['timestamp']
+                msg_dict['timestamp'] = self.format_time(msg_dict['timestamp'])
+            entry['messages'].append(msg_dict)
+
+        cache[conversation_id] = entry
+        while len(cache) > self.cached_conversations:
+            cache.popitem(last=False)
+        return list(entry['messages'])
 
     def render_sidebar(self):
         """Render sidebar with conversation history"""
@@ -64,8 +181,12 @@ class EWA:
         
             if st.button("New Session"):
                 user = st.session_state.user
+                conversation_cache = st.session_state.get('conversation_cache', OrderedDict())
+                sidebar_cache = st.session_state.get('sidebar_cache', {})
                 st.session_state.clear()
                 st.session_state.user = user
+                st.session_state.conversation_cache = conversation_cache
+                st.session_state.sidebar_cache = sidebar_cache
                 st.session_state.logged_in = True
                 st.session_state.messages = [
                     {**INITIAL_ASSISTANT_MESSAGE, "timestamp": self.format_time()}
@@ -75,7 +196,12 @@ class EWA:
             
             if st.button("Latest Chat History"):
                 st.session_state.page = 0
+                st.session_state.page_cursors = []
+                st.session_state.sidebar_cache = {}
                 st.rerun()
+
+            if st.button("Sign out"):
+                self.logout()
             
             st.divider()
         
@@ -88,20 +214,17 @@ class EWA:
         
             # Display conversations
             for conv in convs:
-                conv_data = conv.to_dict()
-                if st.button(f"{conv_data.get('title', 'Untitled')}", key=conv.id):
-                    messages = db.collection('conversations').document(conv.id)\
-                               .collection('messages').order_by('timestamp').stream()
-                    st.session_state.messages = []
-                    for msg in messages:
-                        msg_dict = msg.to_dict()
-                        if 'timestamp' in msg_dict:
-                            msg_dict['timestamp'] = self.format_time(msg_dict['timestamp'])
-                        st.session_state.messages.append(msg_dict)
-                    st.session_state.current_conversation_id = conv.id
+                if st.button(f"{conv.get('title', 'Untitled')}", key=conv['id']):
+                    st.session_state.messages = self.load_conversation(conv['id'])
+                    st.session_state.pop('message_window', None)
+                    st.session_state.pop('expanded_messages', None)
+                    st.session_state.current_conversation_id = conv['id']
+                    st.session_state.conversation_stats = conversation_stats(conv, st.session_state.messages)
                     st.rerun()
             
             # Simple pagination controls
+            total_pages = max(1, -(-self.count_conversations(st.session_state.user.uid) // self.conversations_per_page))
+            st.caption(f"Page {st.session_state.page + 1} of {max(total_pages, st.session_state.page + 1)}")
             cols = st.columns(2)
             with cols[0]:
                 if st.session_state.page > 0:
@@ -111,207 +234,393 @@ class EWA:
             with cols[1]:
                 if has_more:
                     if st.button("Next"):
+                        last = convs[-1]
+                        cursors = st.session_state.get('page_cursors', [])[:st.session_state.page]
+                        cursors.append({'updated_at': last.get('updated_at'), '__name__': last['id']})
+                        st.session_state.page_cursors = cursors
                         st.session_state.page += 1
+                        st.session_state.sidebar_cache.pop((st.session_state.user.uid, st.session_state.page), None)
                         st.rerun()
     
+    def render_messages(self):
+        """Render the chat history in a window of the latest messages.
+
+        Earlier messages stay hidden behind "Load earlier messages", and long
+        essays and reviews show a preview until expanded, so a rerun costs
+        about the same however long the conversation grows.
+        """
+        messages = st.session_state.get('messages', [])
+        window = st.session_state.get('message_window', self.visible_messages)
+        first = max(0, len(messages) - window)
+        if first > 0:
+            if st.button(f"Load earlier messages ({first} hidden)", key="load_earlier"):
+                st.session_state.message_window = window + self.visible_messages
+                st.rerun()
+
+        expanded = st.session_state.setdefault('expanded_messages', set())
+        for index in range(first, len(messages)):
+            msg = messages[index]
+            content = msg['content']
+            with st.chat_message(msg["role"]):
+                if len(content) <= self.collapse_chars:
+                    st.write(f"{msg.get('timestamp', '')} {content}")
+                elif index in expanded:
+                    st.write(f"{msg.get('timestamp', '')} {content}")
+                    if st.button("Show less", key=f"collapse_{index}"):
+                        expanded.discard(index)
+                        st.rerun()
+                else:
+                    preview = content[:self.preview_chars].rsplit(' ', 1)[0]
+                    st.write(f"{msg.get('timestamp', '')} {preview} …")
+                    if st.button(f"Show full message ({len(content.split())} words)", key=f"expand_{index}"):
+                        expanded.add(index)
+                        st.rerun()
+
     def handle_chat(self, prompt):
         """Process chat messages and manage conversation flow"""
         if not prompt:
             return
 
+        timer = StageTimer()
         current_time = datetime.now(self.tz)
         time_str = self.format_time(current_time)
 
         # Display user message
         st.chat_message("user").write(f"{time_str} {prompt}")
 
-        # Build messages context
-        messages = [
-            {"role": "system", "content": SYSTEM_INSTRUCTIONS},
-            {"role": "system", "content": MODULE_SYLLABUS},
-            {"role": "system", "content": MODULE_LEARNING_OBJECTIVES}
-        ]
-        
         # Check for review/scoring related keywords
-        review_keywords = ["grade", "score", "review", "assess", "evaluate", "feedback", "rubric"]
-        is_review = any(keyword in prompt.lower() for keyword in review_keywords)
+        is_review = is_review_request(prompt)
     
         if is_review:            
-            messages.append({
-                "role": "system",
-                "content": REVIEW_INSTRUCTIONS            
-            })            
+            tail_messages = [REVIEW_MODE_MESSAGE]
             max_tokens = 5000
-            context_window = 10  # Larger context window for review tasks         
+            token_budget = self.review_token_budget  # Room for a full essay and past reviews
         else:            
+            tail_messages = []
             max_tokens = 600
-            context_window = 6   # Smaller context window for regular chat
+            token_budget = self.chat_token_budget
 
+        # Fill the budget with conversation history, newest first
+        with timer.span('build'):
+            messages, prompt_tokens = build_context(
+                SYSTEM_MESSAGES, st.session_state.get('messages', []), prompt, token_budget, tail_messages
+            )
+            # The draft a review is about; full reviews of it are answered from the cache
+            essay = find_essay(prompt, st.session_state.get('messages', [])) if is_review else None
+            # A full rubric review only when the draft is in this message or the
+            # student asks for a score; other questions about an earlier draft
+            # ("any feedback on my outline?") get a normal reply
+            full_review = essay is not None and (essay == prompt or is_scoring_request(prompt))
+        st.session_state.last_prompt_tokens = prompt_tokens
 
-        # Add conversation history
-        if 'messages' in st.session_state:
-            # Keep only the most recent messages within the context window
-            recent_messages = st.session_state.messages[-context_window:]
-
-            # Ensure we have the initial assistant message
-            if st.session_state.messages and st.session_state.messages[0].get('role') == 'assistant':
-                if recent_messages[0].get('role') != 'assistant':
-                    recent_messages = [st.session_state.messages[0]] + recent_messages[-context_window+1:]
-
-            messages.extend(recent_messages)
-
-        # Add current prompt
-        messages.append({"role": "user", "content": prompt})
+        turn = {
+            'conversation_id': st.session_state.get('current_conversation_id'),
+            'user_id': st.session_state.user.uid,
+            'stats': st.session_state.get('conversation_stats'),
+            'date': current_time,
+            'prompt': prompt,
+            'messages': messages,
+            'max_tokens': max_tokens,
+            'prompt_tokens': prompt_tokens,
+            'is_review': is_review,
+            'essay': essay,
+            'full_review': full_review,
+            'timer': timer
+        }
+        user_message = {"role": "user", "content": prompt, "timestamp": time_str}
 
         try:
-            # Get AI response
-            response = OpenAI(api_key=st.secrets["default"]["OPENAI_API_KEY"]).chat.completions.create(
-                model="gpt-4o-mini",
-                messages=messages,
-                temperature=0,
-                max_tokens=max_tokens
-            )
+            # Run the turn on the async loop, streaming the reply into the chat as it arrives
+            with st.chat_message("assistant"):
+                placeholder = st.empty()
+                run = get_async_bridge().run(
+                    partial(self.run_turn, turn, {**user_message, "timestamp": current_time})
+                )
+                assistant_content = ""
+                for kind, value in run:
+                    if kind == "delta":
+                        assistant_content += value
+                        placeholder.markdown(f"{time_str} {assistant_content}▌")
+                    else:  # Progress updates and the final reply
+                        placeholder.markdown(f"{time_str} {value}")
+                assistant_reply = run.result()
 
-            assistant_content = response.choices[0].message.content
-            
-            # Add disclaimer for review responses
-            if is_review and ("Estimated Grade" in assistant_content or "Total Score:" in assistant_content):
-                assistant_content = f"{assistant_content}\n\n{DISCLAIMER}"
-                
-            st.chat_message("assistant").write(f"{time_str} {assistant_content}")
+            st.session_state.last_ttft = assistant_reply['ttft']
+            st.session_state.last_usage = assistant_reply['usage']
 
             # Update session state
             if 'messages' not in st.session_state:
                 st.session_state.messages = []
 
-            user_message = {"role": "user", "content": prompt, "timestamp": time_str}
-            assistant_msg = {"role": "assistant", "content": assistant_content, "timestamp": time_str}
-            
+            assistant_msg = {"role": "assistant", "content": assistant_reply['content'], "timestamp": time_str}
             st.session_state.messages.extend([user_message, assistant_msg])
 
-            # Save to database
-            conversation_id = st.session_state.get('current_conversation_id')
-            conversation_id = self.save_message(conversation_id, 
-                                             {**user_message, "timestamp": current_time})
-            self.save_message(conversation_id, 
-                            {**assistant_msg, "timestamp": current_time})
-
+        except openai.RateLimitError:
+            st.error("The assistant is very busy right now. Please wait a minute and send your message again.")
         except Exception as e:
             st.error(f"Error processing message: {str(e)}")
 
-    def save_message(self, conversation_id, message):
-        """Save message and update title with summary"""
-        current_time = datetime.now(self.tz)
+        finally:
+            self.record_turn(turn)
 
+    async def run_turn(self, turn, user_message, emit):
+        """Generate the reply while the user message is saved, then save the reply.
+
+        Runs on the async bridge loop. The reply is emitted before it is saved,
+        so the script thread renders it while the write is in flight.
+        """
+        user_saved = asyncio.create_task(self.save_message(turn, user_message))
         try:
-            # For new conversation
-            if not conversation_id:
-                new_conv_ref = db.collection('conversations').document()
-                conversation_id = new_conv_ref.id
-                new_conv_ref.set({
-                    'user_id': st.session_state.user.uid,
-                    'created_at': firestore.SERVER_TIMESTAMP,
-                    'updated_at': firestore.SERVER_TIMESTAMP,
-                    'title': f"{current_time.strftime('%b %d, %Y')} • New Chat [1📝]",
-                    'status': 'active'
-                })
-                st.session_state.current_conversation_id = conversation_id
-        
-            # Save message
-            conv_ref = db.collection('conversations').document(conversation_id)
-            conv_ref.collection('messages').add({
-                **message,
-                "timestamp": firestore.SERVER_TIMESTAMP
-            })
-
-            # Get messages for count and context
-            messages = list(conv_ref.collection('messages').get())
-            count = len(messages)
-        
-            # Get last 5 messages for context
-            recent_messages = [msg.to_dict()['content'] for msg in messages[-5:]]
-            context = " ".join(recent_messages)
-        
-            # Get summary from GPT
-            summary = OpenAI(api_key=st.secrets["default"]["OPENAI_API_KEY"]).chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[
-                    {"role": "system", "content": "Create a 2-3 word title for this conversation."},
-                    {"role": "user", "content": context}
-                ],
-                temperature=0.3,
-                max_tokens=10
-            ).choices[0].message.content.strip()
-        
-            # Update conversation with summary title and count
-            conv_ref.set({
-                'updated_at': firestore.SERVER_TIMESTAMP,
-                'title': f"{current_time.strftime('%b %d, %Y')} • {summary} [{count}📝]"
-            }, merge=True)
-        
-            return conversation_id
-            
-        except Exception as e:
-            st.error(f"Error: {str(e)}")
-            return conversation_id
+            assistant_msg = await self.get_reply(turn, emit)
+        finally:
+            await user_saved
+
+        emit(("reply", assistant_msg['content']))
+        await self.save_message(turn, assistant_msg)
+
+        # Written in the background, like the review cache
+        asyncio.get_running_loop().run_in_executor(
+            None, partial(record_metrics, db, 'turn', turn['user_id'], turn['conversation_id'],
+                          turn['timer'].finish(), assistant_msg['usage'],
+                          is_review=turn['is_review'], cached=assistant_msg['cached'])
+        )
+        return assistant_msg
+
+    async def get_reply(self, turn, emit):
+        """Produce the assistant message from the review cache, the parallel
+        review engine or a streamed completion"""
+        review_key = None
+        cached_review = None
+        # Only parallel reviews depend on nothing but the essay and request;
+        # a completion also sees the conversation history, so it is not cached
+        parallel = turn['full_review'] and self.parallel_reviews
+        if parallel:
+            review_key = self.review_cache.key_for(turn['essay'], turn['prompt'])
+            with turn['timer'].span('cache_lookup'):
+                cached_review = await asyncio.to_thread(self.review_cache.get, review_key)
+
+        if cached_review is not None:
+            content, ttft, usage = cached_review, 0.0, None
+        else:
+            with turn['timer'].span('llm'):
+                if parallel:
+                    content, ttft, usage = await self.get_parallel_review(turn, emit)
+                else:
+                    content, ttft, usage = await self.get_completion(turn, emit)
+            turn['timer'].mark('ttft', ttft)
+            if review_key:
+                # Written in the background; the reply does not wait for it
+                asyncio.get_running_loop().run_in_executor(None, self.review_cache.put, review_key, content)
+
+        # Add disclaimer for review responses
+        if turn['is_review'] and ("Estimated Grade" in content or "Total Score:" in content):
+            content = f"{content}\n\n{DISCLAIMER}"
+
+        return {
+            "role": "assistant",
+            "content": content,
+            "timestamp": datetime.now(self.tz),
+            "ttft": ttft,
+            "prompt_tokens": turn['prompt_tokens'],
+            "usage": usage,
+            "cached": cached_review is not None
+        }
+
+    async def get_completion(self, turn, emit):
+        """Get the assistant reply, emitting chunks as they arrive.
+
+        Returns the full reply, the time to first token in seconds and the
+        token usage reported by the API.
+        """
+        start = time.perf_counter()
+
+        def create(**options):
+            # Queued in the shared rate governor; retried there on 429s
+            return self.governor.call_async(
+                partial(self.async_client.chat.completions.create, model="gpt-4o-mini",
+                        messages=turn['messages'], temperature=0, max_tokens=turn['max_tokens'], **options),
+                'review' if turn['is_review'] else 'chat',
+                request_tokens(turn['messages'], turn['max_tokens']),
+                turn['user_id'],
+                self.queue_reporter(emit)
+            )
+
+        if not self.stream_responses:
+            response = await create()
+            content = response.choices[0].message.content
+            return content, round(time.perf_counter() - start, 3), usage_dict(response.usage)
+
+        stream = await create(stream=True, stream_options={"include_usage": True})
+
+        content = ""
+        ttft = None
+        usage = None
+        async for chunk in stream:
+            if chunk.usage:
+                usage = usage_dict(chunk.usage)
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if not delta:
+                continue
+            if ttft is None:
+                ttft = round(time.perf_counter() - start, 3)
+            content += delta
+            emit(("delta", delta))
+
+        return content, ttft, usage
+
+    async def get_parallel_review(self, turn, emit):
+        """Review an essay with one concurrent completion per rubric area.
+
+        Returns the merged review, the time until the first area was scored
+        and the summed token usage.
+        """
+        start = time.perf_counter()
+        first_area = []
+
+        def report(area, done, total):
+            if not first_area:
+                first_area.append(round(time.perf_counter() - start, 3))
+            emit(("status", f"Reviewing your essay... scored {area} ({done}/{total})"))
+
+        emit(("status", "Reviewing your essay..."))
+        essay = turn['essay']
+        request = turn['prompt'] if turn['prompt'].strip() != essay.strip() else None
+        content, usage = await self.review_engine.review(
+            essay, request, report, turn['user_id'], self.queue_reporter(emit)
+        )
+        return content, first_area[0] if first_area else None, usage
+
+    def queue_reporter(self, emit):
+        """on_wait callback for the rate governor, showing the student their place in the queue"""
+        def report(position):
+            emit(("status", f"The assistant is busy with other students. You are number {position} in the queue..."))
+        return report
+
+    async def save_message(self, turn, message):
+        """Save a message in one batched write with the conversation metadata.
+
+        The conversation id and stats on turn are updated for the next write.
+        """
+        with turn['timer'].span(f"save_{message['role']}"):
+            turn['conversation_id'], turn['stats'] = await persist_turn_async(
+                self.async_db,
+                turn['conversation_id'],
+                turn['user_id'],
+                [message],
+                stats=turn['stats'],
+                title=f"{turn['date'].strftime('%b %d, %Y')} • New Chat [1📝]",
+                day=turn['date'].strftime('%Y-%m-%d'),
+                is_review=turn['is_review'] and message['role'] == 'user'
+            )
+
+    def record_turn(self, turn):
+        """Keep session state in step with a turn's writes and queue a title update"""
+        if not turn['conversation_id']:
+            return
+
+        if st.session_state.get('current_conversation_id') != turn['conversation_id']:
+            st.session_state.pop('conversation_count', None)
+        st.session_state.current_conversation_id = turn['conversation_id']
+        st.session_state.conversation_stats = turn['stats']
+        self.patch_sidebar_cache(turn)
+
+        # The title is refreshed in the background
+        get_title_worker().submit(
+            turn['conversation_id'],
+            turn['stats']['message_count'],
+            turn['date'].strftime('%b %d, %Y'),
+            " ".join(turn['stats']['recent_messages']),
+            user_id=turn['user_id']
+        )
         
-    def login(self, email, password):
-        """Authenticate user with Firebase Auth REST API"""
+    def login(self, email, password, remember=False):
+        """Authenticate with the Firebase Auth REST API in one round trip"""
         try:
-            # Firebase Auth REST API endpoint
-            auth_url = f"https://identitytoolkit.googleapis.com/v1/accounts:signInWithPassword?key={st.secrets['default']['apiKey']}"
-        
-            # Request body
-            auth_data = {
-                "email": email,
-                "password": password,
-                "returnSecureToken": True
-            }
-        
-            # Make authentication request
-            response = requests.post(auth_url, json=auth_data)
-            if response.status_code != 200:
-                raise Exception("Authentication failed")
-            
-            # Get user details
-            user = auth.get_user_by_email(email)
-            st.session_state.user = user
-            st.session_state.logged_in = True 
-            st.session_state.messages = [{
-                **INITIAL_ASSISTANT_MESSAGE,
-                "timestamp": self.format_time()
-            }]
-            st.session_state.stage = 'initial'
-            return True
-        
-        except Exception as e:
+            user = get_identity().sign_in(email, password)
+        except Exception:
             st.error("Login failed")
             return False
-        
+
+        self.start_session(user)
+        if remember:
+            st.session_state.remember_token = user.refresh_token  # Stored in a cookie on the next run
+        return True
+
+    def resume_login(self):
+        """Sign a returning user back in from a remembered refresh token, without a password"""
+        if st.session_state.get('resume_attempted'):
+            return False
+        st.session_state.resume_attempted = True  # Cookies are fixed for the session, so try once
+
+        refresh_token = st.context.cookies.get(REMEMBER_COOKIE)
+        if not refresh_token:
+            return False
+        try:
+            user = get_identity().refresh(refresh_token)
+        except Exception:
+            st.session_state.remember_token = ""  # Expired or revoked, so forget it
+            return False
+
+        self.start_session(user)
+        st.session_state.remember_token = user.refresh_token
+        return True
+
+    def start_session(self, user):
+        st.session_state.user = user
+        st.session_state.logged_in = True
+        st.session_state.messages = [{
+            **INITIAL_ASSISTANT_MESSAGE,
+            "timestamp": self.format_time()
+        }]
+        st.session_state.stage = 'initial'
+
+    def logout(self):
+        """End the session and forget the remembered sign-in on this device"""
+        st.session_state.clear()
+        # The request's cookies still hold the old token, so do not resume from it
+        st.session_state.resume_attempted = True
+        st.session_state.remember_token = ""  # Cleared by the login page
+        st.rerun()
+
+    def store_remember_cookie(self):
+        """Write (or clear, for an empty token) the remember-me cookie in the browser"""
+        refresh_token = st.session_state.pop('remember_token')
+        max_age = REMEMBER_DAYS * 86400 if refresh_token else 0
+        components.html(
+            f"<script>window.parent.document.cookie = '{REMEMBER_COOKIE}=' + "
+            f"encodeURIComponent({json.dumps(refresh_token)}) + "
+            f"'; max-age={max_age}; path=/; SameSite=Strict; Secure';</script>",
+            height=0
+        )
+
 def main():
     app = EWA()
 
     # Login page
-    if not st.session_state.get('logged_in', False):
+    if not st.session_state.get('logged_in', False) and not app.resume_login():
         st.title("DUTE Essay Writing Assistant")
+        if 'remember_token' in st.session_state:
+            app.store_remember_cookie()
         with st.form("login"):
             email = st.text_input("Email")
             password = st.text_input("Password", type="password")
+            remember = st.checkbox("Keep me signed in on this device")
             if st.form_submit_button("Login", use_container_width=True):
-                if app.login(email, password):
+                if app.login(email, password, remember):
                     st.rerun()
         return
 
+    if 'remember_token' in st.session_state:
+        app.store_remember_cookie()
+
     # Main chat interface
     st.title("DUTE Essay Writing Assistant")
     app.render_sidebar()
 
     # Display message history
-    if 'messages' in st.session_state:
-        for msg in st.session_state.messages:
-            st.chat_message(msg["role"]).write(
-                f"{msg.get('timestamp', '')} {msg['content']}"
-            )
+    app.render_messages()
 
     # Chat input
     if prompt := st.chat_input("Type your message here..."):
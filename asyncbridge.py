@@ -0,0 +1,54 @@
+# asyncbridge.py
+import asyncio
+import queue
+import threading
+
+_DONE = object()
+
+
+class AsyncBridge:
+    """A long-lived event loop on its own thread for Streamlit's synchronous script.
+
+    Async clients (OpenAI, Firestore) are bound to this one loop, so they keep
+    their connections across reruns and sessions. The script thread hands
+    coroutines over with run() and consumes their events as they arrive.
+    """
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self.loop.run_forever, name="async-bridge", daemon=True)
+        self._thread.start()
+
+    def submit(self, coro):
+        """Schedule a coroutine on the loop, returning a concurrent.futures.Future"""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def run(self, coro_fn):
+        """Run coro_fn(emit) on the loop; iterate the result for emitted events"""
+        return BridgedRun(self, coro_fn)
+
+
+class BridgedRun:
+    """Events emitted by a coroutine running on the bridge loop.
+
+    Iterating yields each event on the calling thread, where Streamlit
+    elements can safely be updated, and stops when the coroutine finishes.
+    result() then returns its value or raises its exception.
+    """
+
+    def __init__(self, bridge, coro_fn):
+        self._events = queue.Queue()
+        self._future = bridge.submit(self._main(coro_fn))
+
+    async def _main(self, coro_fn):
+        try:
+            return await coro_fn(self._events.put)
+        finally:
+            self._events.put(_DONE)
+
+    def __iter__(self):
+        while (event := self._events.get()) is not _DONE:
+            yield event
+
+    def result(self):
+        return self._future.result()
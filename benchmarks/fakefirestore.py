@@ -0,0 +1,302 @@
+# benchmarks/fakefirestore.py
+"""In-memory stand-in for the parts of the Firestore client the app uses.
+
+Documents live in one dict keyed by path. Every read and write is counted
+the way Firestore bills it (a query costs at least one read, an aggregation
+one read per 1000 index entries), so the load test can report Firestore
+operations per turn without a project or the emulator.
+"""
+import functools
+import math
+import threading
+import uuid
+from datetime import datetime, timezone
+
+from firebase_admin import firestore
+from google.api_core.exceptions import NotFound
+
+_OPS = {
+    '==': lambda a, b: a == b,
+    '!=': lambda a, b: a != b,
+    '<': lambda a, b: a < b,
+    '<=': lambda a, b: a <= b,
+    '>': lambda a, b: a > b,
+    '>=': lambda a, b: a >= b,
+    'in': lambda a, b: a in b,
+}
+_MISSING = object()
+
+
+def _get_field(data, field_path):
+    for part in field_path.split('.'):
+        if not isinstance(data, dict) or part not in data:
+            return _MISSING
+        data = data[part]
+    return data
+
+
+def _set_field(data, field_path, value):
+    *parents, last = field_path.split('.')
+    for part in parents:
+        data = data.setdefault(part, {})
+    current = data.get(last, 0)
+    if value is firestore.SERVER_TIMESTAMP:
+        value = datetime.now(timezone.utc)
+    elif isinstance(value, firestore.Increment):
+        value = (current if isinstance(current, (int, float)) else 0) + value.value
+    elif isinstance(value, dict):
+        nested = {}
+        for key, item in value.items():
+            _set_field(nested, key, item)
+        value = nested
+    data[last] = value
+
+
+def _merge(target, updates):
+    for key, value in updates.items():
+        if isinstance(value, dict) and isinstance(target.get(key), dict):
+            _merge(target[key], value)
+        else:
+            _set_field(target, key, value)
+
+
+class FakeFirestore:
+    """Thread-safe in-memory database with read/write counters"""
+
+    def __init__(self):
+        self.docs = {}
+        self.reads = 0
+        self.writes = 0
+        self.lock = threading.RLock()
+
+    def collection(self, name):
+        return FakeCollection(self, (name,))
+
+    def batch(self):
+        return FakeBatch(self)
+
+    def get_all(self, references, field_paths=None):
+        return [reference.get(field_paths) for reference in references]
+
+    def counters(self):
+        with self.lock:
+            return {'reads': self.reads, 'writes': self.writes}
+
+    def _read(self, count):
+        with self.lock:
+            self.reads += count
+
+    def _apply(self, operations):
+        """Apply a list of (kind, path, data, merge) writes atomically"""
+        with self.lock:
+            for kind, path, _, _ in operations:
+                if kind == 'update' and path not in self.docs:
+                    raise NotFound(f"No document to update: {'/'.join(path)}")
+            for kind, path, data, merge in operations:
+                self.writes += 1
+                if kind == 'delete':
+                    self.docs.pop(path, None)
+                elif kind == 'set' and not merge:
+                    self.docs[path] = {}
+                    _merge(self.docs[path], data)
+                else:
+                    _merge(self.docs.setdefault(path, {}), data)
+
+
+class FakeAsyncFirestore(FakeFirestore):
+    """Async client facade over the same in-memory store"""
+
+    def __init__(self, source):
+        self.__dict__ = source.__dict__
+
+    def batch(self):
+        return FakeAsyncBatch(self)
+
+
+class FakeSnapshot:
+    def __init__(self, reference, data):
+        self.reference = reference
+        self.id = reference.id
+        self._data = data
+
+    @property
+    def exists(self):
+        return self._data is not None
+
+    def to_dict(self):
+        return dict(self._data) if self._data is not None else None
+
+    def get(self, field_path):
+        value = _get_field(self._data or {}, field_path)
+        if value is _MISSING:
+            raise KeyError(field_path)
+        return value
+
+
+class FakeDocument:
+    def __init__(self, db, path):
+        self.db = db
+        self.path = path
+        self.id = path[-1]
+
+    def collection(self, name):
+        return FakeCollection(self.db, self.path + (name,))
+
+    def get(self, field_paths=None, **kwargs):
+        self.db._read(1)
+        with self.db.lock:
+            data = self.db.docs.get(self.path)
+            if data is not None:
+                data = dict(data)
+                if field_paths is not None:
+                    data = {field: data[field] for field in field_paths if field in data}
+        return FakeSnapshot(self, data)
+
+    def set(self, data, merge=False):
+        self.db._apply([('set', self.path, data, merge)])
+
+    def update(self, data):
+        self.db._apply([('update', self.path, data, True)])
+
+    def delete(self):
+        self.db._apply([('delete', self.path, None, False)])
+
+
+class FakeQuery:
+    def __init__(self, db, path, filters=(), orders=(), limit=None, cursor=None, fields=None):
+        self.db = db
+        self.path = path
+        self._filters = filters
+        self._orders = orders
+        self._limit = limit
+        self._cursor = cursor
+        self._fields = fields
+
+    def _copy(self, **changes):
+        state = dict(filters=self._filters, orders=self._orders, limit=self._limit,
+                     cursor=self._cursor, fields=self._fields)
+        state.update(changes)
+        return FakeQuery(self.db, self.path, **state)
+
+    def where(self, field, op, value):
+        return self._copy(filters=self._filters + ((field, op, value),))
+
+    def order_by(self, field, direction='ASCENDING'):
+        return self._copy(orders=self._orders + ((field, direction),))
+
+    def limit(self, count):
+        return self._copy(limit=count)
+
+    def start_after(self, cursor):
+        if isinstance(cursor, FakeSnapshot):
+            cursor = {**cursor.to_dict(), '__name__': cursor.id}
+        return self._copy(cursor=cursor)
+
+    def select(self, fields):
+        return self._copy(fields=list(fields))
+
+    def count(self):
+        return FakeAggregation(self, len)
+
+    def sum(self, field):
+        return FakeAggregation(self, lambda docs: sum(
+            value for _, data in docs
+            if isinstance(value := _get_field(data, field), (int, float))
+        ))
+
+    def _value(self, path, data, field):
+        return path[-1] if field == '__name__' else _get_field(data, field)
+
+    def _matching(self):
+        """Documents matching filters, order and cursor, before the limit"""
+        with self.db.lock:
+            docs = [(path, dict(data)) for path, data in self.db.docs.items()
+                    if path[:-1] == self.path]
+
+        for field, op, value in self._filters:
+            docs = [(path, data) for path, data in docs
+                    if (found := self._value(path, data, field)) is not _MISSING and _OPS[op](found, value)]
+
+        orders = self._orders + (() if any(f == '__name__' for f, _ in self._orders) else (('__name__', 'ASCENDING'),))
+        docs = [(path, data) for path, data in docs
+                if all(self._value(path, data, field) is not _MISSING for field, _ in orders)]
+
+        def compare(a_values, b_values):
+            for (_, direction), a, b in zip(orders, a_values, b_values):
+                if a != b:
+                    result = -1 if a < b else 1
+                    return -result if direction == 'DESCENDING' else result
+            return 0
+
+        def key_values(path, data):
+            return [self._value(path, data, field) for field, _ in orders]
+
+        docs.sort(key=functools.cmp_to_key(lambda a, b: compare(key_values(*a), key_values(*b))))
+        if self._cursor is not None:
+            cursor = [self._cursor.get(field) for field, _ in orders]
+            docs = [(path, data) for path, data in docs if compare(key_values(path, data), cursor) > 0]
+        return docs
+
+    def stream(self, **kwargs):
+        docs = self._matching()
+        if self._limit is not None:
+            docs = docs[:self._limit]
+        self.db._read(max(1, len(docs)))
+        for path, data in docs:
+            if self._fields is not None:
+                data = {field: data[field] for field in self._fields if field in data}
+            yield FakeSnapshot(FakeDocument(self.db, path), data)
+
+    def get(self, **kwargs):
+        return list(self.stream())
+
+
+class FakeCollection(FakeQuery):
+    def __init__(self, db, path):
+        super().__init__(db, path)
+        self.id = path[-1]
+
+    def document(self, document_id=None):
+        return FakeDocument(self.db, self.path + (document_id or uuid.uuid4().hex[:20],))
+
+
+class FakeAggregationResult:
+    def __init__(self, value):
+        self.alias = 'field_1'
+        self.value = value
+
+
+class FakeAggregation:
+    def __init__(self, query, aggregate):
+        self.query = query
+        self.aggregate = aggregate
+
+    def get(self, **kwargs):
+        docs = self.query._matching()
+        self.query.db._read(max(1, math.ceil(len(docs) / 1000)))
+        return [[FakeAggregationResult(self.aggregate(docs))]]
+
+
+class FakeBatch:
+    def __init__(self, db):
+        self.db = db
+        self.operations = []
+
+    def set(self, reference, data, merge=False):
+        self.operations.append(('set', reference.path, data, merge))
+
+    def update(self, reference, data):
+        self.operations.append(('update', reference.path, data, True))
+
+    def delete(self, reference):
+        self.operations.append(('delete', reference.path, None, False))
+
+    def commit(self):
+        self.db._apply(self.operations)
+        return []
+
+
+class FakeAsyncBatch(FakeBatch):
+    async def commit(self):
+        self.db._apply(self.operations)
+        return []
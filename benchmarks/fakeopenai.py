@@ -0,0 +1,148 @@
+# benchmarks/fakeopenai.py
+"""Local stand-in for the OpenAI chat completions endpoint.
+
+Point the app at it with OPENAI_BASE_URL. Replies are canned text delivered
+with a configurable time to first token and per-token delay, streamed as
+server-sent events when the request asks for it. Calls are counted by kind
+(chat, review, title) so the load test can report LLM calls per turn.
+"""
+import json
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+REVIEW_SECTION = ("**{name} ([{score}]/{points}):** The essay handles this area adequately.\n"
+                  "   - **Strength:** \"a clear thesis\"\n"
+                  "   - **Suggestions for Improvement:**\n"
+                  "     1. Add evidence.\n     2. Tighten paragraphs.\n     3. Vary sentences.")
+
+
+class FakeOpenAI:
+    """Threaded HTTP server answering /v1/chat/completions with canned replies"""
+
+    def __init__(self, ttft=0.3, token_delay=0.01, reply_tokens=120, port=0):
+        self.ttft = ttft
+        self.token_delay = token_delay
+        self.reply_tokens = reply_tokens
+        self.calls = {'chat': 0, 'review': 0, 'title': 0}
+        self.lock = threading.Lock()
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), self._handler())
+        self.server.daemon_threads = True
+        self._thread = threading.Thread(target=self.server.serve_forever, name="fake-openai", daemon=True)
+
+    @property
+    def base_url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def counters(self):
+        with self.lock:
+            return dict(self.calls)
+
+    def classify(self, body):
+        """Title requests ask for 10 tokens; reviews are per-area engine calls or review-mode turns"""
+        if body.get('max_tokens') == 10:
+            return 'title'
+        system = self._system_text(body)
+        if "assessment area only" in system or body.get('max_tokens') == 5000:
+            return 'review'
+        return 'chat'
+
+    def _system_text(self, body):
+        return " ".join(m.get('content', '') for m in body.get('messages', []) if m.get('role') == 'system')
+
+    def reply_for(self, kind, body):
+        if kind == 'title':
+            return "Essay Draft Feedback"
+        system = self._system_text(body)
+        area = re.search(r"Review the essay for the '(.+?)' assessment area only.*?\((\d+) points\)", system, re.DOTALL)
+        if area:
+            points = int(area.group(2))
+            return REVIEW_SECTION.format(name=area.group(1), score=points * 3 // 4, points=points)
+        return " ".join(["word"] * self.reply_tokens)
+
+    def usage_for(self, body, content):
+        prompt_tokens = sum(len(m.get('content', '')) for m in body.get('messages', [])) // 4
+        return {
+            'prompt_tokens': prompt_tokens,
+            'completion_tokens': len(content) // 4,
+            'total_tokens': prompt_tokens + len(content) // 4,
+            'prompt_tokens_details': {'cached_tokens': 0}
+        }
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b"{}")
+                kind = fake.classify(body)
+                with fake.lock:
+                    fake.calls[kind] += 1
+
+                content = fake.reply_for(kind, body)
+                usage = fake.usage_for(body, content)
+                completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+                time.sleep(fake.ttft)
+
+                if body.get('stream'):
+                    self._stream(body, completion_id, content, usage)
+                else:
+                    time.sleep(fake.token_delay * usage['completion_tokens'])
+                    self._send_json({
+                        'id': completion_id, 'object': 'chat.completion', 'created': int(time.time()),
+                        'model': body.get('model'),
+                        'choices': [{'index': 0, 'finish_reason': 'stop',
+                                     'message': {'role': 'assistant', 'content': content}}],
+                        'usage': usage
+                    })
+
+            def _send_json(self, payload):
+                data = json.dumps(payload).encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _chunk(self, payload):
+                data = f"data: {payload}\n\n".encode('utf-8')
+                self.wfile.write(f"{len(data):x}\r\n".encode('ascii') + data + b"\r\n")
+                self.wfile.flush()
+
+            def _stream(self, body, completion_id, content, usage):
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/event-stream')
+                self.send_header('Transfer-Encoding', 'chunked')
+                self.end_headers()
+
+                base = {'id': completion_id, 'object': 'chat.completion.chunk',
+                        'created': int(time.time()), 'model': body.get('model')}
+                for index, word in enumerate(content.split(" ")):
+                    if index:
+                        time.sleep(fake.token_delay)
+                    delta = {'content': word if index == 0 else " " + word}
+                    self._chunk(json.dumps({**base, 'choices': [{'index': 0, 'delta': delta, 'finish_reason': None}]}))
+                self._chunk(json.dumps({**base, 'choices': [{'index': 0, 'delta': {}, 'finish_reason': 'stop'}]}))
+                if (body.get('stream_options') or {}).get('include_usage'):
+                    self._chunk(json.dumps({**base, 'choices': [], 'usage': usage}))
+                self._chunk("[DONE]")
+                self.wfile.write(b"0\r\n\r\n")
+                self.wfile.flush()
+
+        return Handler
@@ -0,0 +1,232 @@
+# benchmarks/loadtest.py
+"""Simulate a class of students against app.py and the admin page, offline.
+
+Firestore is replaced by the in-memory fake and OpenAI by the local fake
+server, so a run needs no credentials and costs nothing. Each student is a
+streamlit AppTest session driven from its own thread: it chats, asks for
+reviews of its own draft and then idles on the sidebar. The admin dashboard is
+rendered last, against everything the students wrote.
+
+    python -m benchmarks.loadtest --students 30 --turns 6 --ttft 0.5
+
+Reports p50/p95 turn latency, Firestore reads and writes per turn and LLM
+calls per turn, and the same for sidebar reruns and the admin dashboard.
+"""
+import argparse
+import json
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytz
+from streamlit.runtime.scriptrunner.script_cache import ScriptCache
+from streamlit.testing.v1 import AppTest
+
+import resources
+from store import persist_turn
+from benchmarks.fakefirestore import FakeFirestore, FakeAsyncFirestore
+from benchmarks.fakeopenai import FakeOpenAI
+
+ROOT = Path(__file__).resolve().parent.parent
+RUN_TIMEOUT = 120  # Seconds one script run may take before AppTest gives up
+ADMIN_EMAIL = "admin@example.com"
+
+PARAGRAPH = ("Student {n} argues that formative feedback shapes how learners revise their writing. "
+             "The draft draws on classroom observation and interviews with teachers, and it compares "
+             "written comments with spoken conferences across two terms of study. ")
+
+
+def essay_for(student):
+    """A unique draft per student, long enough to count as an essay"""
+    return "\n\n".join(PARAGRAPH.format(n=student) * 3 for _ in range(4))
+
+
+def prompt_for(student, turn, review_every):
+    if review_every and turn % review_every == review_every - 1:
+        return f"Please review and score my essay.\n\n{essay_for(student)}"
+    return f"Can you suggest how to strengthen paragraph {turn + 1} of my argument?"
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return round(ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))], 3)
+
+
+def serialise_compilation():
+    """Compile scripts one at a time.
+
+    Every AppTest.run() builds a fresh ScriptCache and parses the script
+    again. CPython's parser is not safe to run from several threads at once
+    here: it fails with "AST constructor recursion depth mismatch".
+    """
+    lock = threading.Lock()
+    get_bytecode = ScriptCache.get_bytecode
+
+    def locked_get_bytecode(self, script_path):
+        with lock:
+            return get_bytecode(self, script_path)
+
+    ScriptCache.get_bytecode = locked_get_bytecode
+
+
+def run_errors(at):
+    """Errors and uncaught exceptions a script run rendered"""
+    return [error.value for error in at.error] + [exception.value for exception in at.exception]
+
+
+def install_fakes(db, llm):
+    """Point the process-wide clients in resources at the fakes"""
+    resources.get_db = lambda: db
+    resources.get_async_db = lambda: FakeAsyncFirestore(db)
+    return {"default": {"OPENAI_API_KEY": "sk-loadtest", "OPENAI_BASE_URL": llm.base_url}}
+
+
+def seed(db, students, conversations):
+    """Create the student and admin user documents and any prior conversations"""
+    now = datetime.now(pytz.timezone("Europe/London"))
+    db.collection('users').document('admin').set({'email': ADMIN_EMAIL, 'role': 'admin'})
+    for student in range(students):
+        uid = f"student-{student}"
+        db.collection('users').document(uid).set({'email': f"{uid}@example.com", 'role': 'student'})
+        for number in range(conversations):
+            persist_turn(db, None, uid, [
+                {"role": "user", "content": f"Earlier question {number}", "timestamp": now},
+                {"role": "assistant", "content": f"Earlier answer {number}", "timestamp": now}
+            ], title=f"{now.strftime('%b %d, %Y')} • Earlier [2📝]", day=now.strftime('%Y-%m-%d'))
+
+
+def new_session(script, secrets, uid, email):
+    at = AppTest.from_file(str(ROOT / script), default_timeout=RUN_TIMEOUT)
+    at.secrets.update(secrets)
+    at.session_state["user"] = SimpleNamespace(uid=uid, email=email)
+    at.session_state["logged_in"] = True
+    at.session_state["messages"] = []
+    return at
+
+
+def run_student(student, args, secrets):
+    """One student's session; returns it with the latency of each chat turn and any errors shown.
+
+    Runs that fail are counted as errors, not timed as turns.
+    """
+    uid = f"student-{student}"
+    at = new_session("app.py", secrets, uid, f"{uid}@example.com")
+    at.run()
+
+    turns, errors = [], run_errors(at)
+    for turn in range(args.turns):
+        if not at.chat_input:
+            errors.append(f"{uid}: no chat input to send turn {turn + 1}")
+            break
+        start = time.perf_counter()
+        at.chat_input[0].set_value(prompt_for(student, turn, args.review_every)).run()
+        elapsed = time.perf_counter() - start
+        failures = run_errors(at)
+        if failures:
+            errors.extend(failures)
+        else:
+            turns.append(elapsed)
+        time.sleep(args.think)
+    return at, turns, errors
+
+
+def measure(db, llm, fn):
+    """Run fn and return its result with the Firestore and LLM calls it made"""
+    before_db, before_llm = db.counters(), llm.counters()
+    result = fn()
+    after_db, after_llm = db.counters(), llm.counters()
+    ops = {key: after_db[key] - before_db[key] for key in after_db}
+    ops.update({f"llm_{key}": after_llm[key] - before_llm[key] for key in after_llm})
+    return result, ops
+
+
+def summarise(latencies, ops, count):
+    summary = {
+        'count': count,
+        'p50': percentile(latencies, 50),
+        'p95': percentile(latencies, 95),
+        'mean': round(statistics.mean(latencies), 3) if latencies else None,
+    }
+    summary.update({f"{key}_per_op": round(value / count, 2) if count else None for key, value in ops.items()})
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--students", type=int, default=10, help="concurrent student sessions")
+    parser.add_argument("--turns", type=int, default=6, help="chat turns per student")
+    parser.add_argument("--review-every", type=int, default=3, help="every Nth turn is a review request (0 for none)")
+    parser.add_argument("--conversations", type=int, default=5, help="prior conversations seeded per student")
+    parser.add_argument("--think", type=float, default=0.0, help="seconds a student waits between turns")
+    parser.add_argument("--ttft", type=float, default=0.3, help="fake OpenAI time to first token")
+    parser.add_argument("--token-delay", type=float, default=0.01, help="fake OpenAI delay per token")
+    parser.add_argument("--reruns", type=int, default=3, help="idle sidebar reruns per student after chatting")
+    parser.add_argument("--settle", type=float, default=4.0, help="seconds to wait for debounced title updates")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args(argv)
+
+    db = FakeFirestore()
+    llm = FakeOpenAI(ttft=args.ttft, token_delay=args.token_delay).start()
+    secrets = install_fakes(db, llm)
+    serialise_compilation()
+    seed(db, args.students, args.conversations)
+
+    report = {'config': vars(args)}
+    try:
+        with ThreadPoolExecutor(max_workers=args.students) as pool:
+            def chat_phase():
+                results = list(pool.map(lambda s: run_student(s, args, secrets), range(args.students)))
+                # Let debounced title updates land so their calls count towards the turns
+                time.sleep(args.settle)
+                return results
+
+            results, chat_ops = measure(db, llm, chat_phase)
+            turn_latencies = [latency for _, turns, _ in results for latency in turns]
+            report['turns'] = summarise(turn_latencies, chat_ops, len(turn_latencies))
+            report['errors'] = [error for _, _, errors in results for error in errors]
+
+            def rerun(at):
+                latencies = []
+                for _ in range(args.reruns):
+                    start = time.perf_counter()
+                    at.run()
+                    latencies.append(time.perf_counter() - start)
+                return latencies
+
+            reruns, rerun_ops = measure(db, llm, lambda: list(pool.map(rerun, [at for at, _, _ in results])))
+            rerun_latencies = [latency for latencies in reruns for latency in latencies]
+            report['sidebar_reruns'] = summarise(rerun_latencies, rerun_ops, len(rerun_latencies))
+
+        def admin_phase():
+            at = new_session("pages/admin.py", secrets, "admin", ADMIN_EMAIL)
+            start = time.perf_counter()
+            at.run()
+            return time.perf_counter() - start, run_errors(at)
+
+        (admin_latency, admin_errors), admin_ops = measure(db, llm, admin_phase)
+        report['admin_dashboard'] = summarise([admin_latency], admin_ops, 1)
+        report['errors'].extend(admin_errors)
+    finally:
+        llm.stop()
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    print(f"{args.students} students x {args.turns} turns, fake TTFT {args.ttft}s")
+    for name in ('turns', 'sidebar_reruns', 'admin_dashboard'):
+        row = report[name]
+        print(f"\n{name} (n={row['count']}): p50 {row['p50']}s  p95 {row['p95']}s  mean {row['mean']}s")
+        print("  per op: " + ", ".join(f"{key[:-7]} {value}" for key, value in row.items() if key.endswith('_per_op')))
+    if report['errors']:
+        print(f"\n{len(report['errors'])} errors, first: {report['errors'][0]}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+# export.py
+import base64
+import csv
+import gzip
+import heapq
+import io
+import json
+from datetime import datetime
+
+EXPORT_FIELDS = ['user_id', 'email', 'conversation_id', 'conversation_title',
+                 'message_id', 'timestamp', 'role', 'content', 'words']
+EXPORT_FORMATS = {'CSV': 'csv', 'JSONL': 'jsonl'}
+PAGE_SIZE = 200           # Conversations or messages fetched per query
+MAX_IN_FILTER = 30        # Firestore's limit on values in an 'in' filter
+MAX_ROWS_PER_PART = 50000  # Rows written before a part ends and a cursor is returned
+
+
+def encode_cursor(position, start=None, end=None, user_ids=None):
+    """An opaque resume token for the conversation after `position` and the filters"""
+    created_at, conversation_id = position
+    payload = {
+        'created_at': created_at.isoformat(), 'id': conversation_id,
+        'start': start.isoformat() if start else None,
+        'end': end.isoformat() if end else None,
+        'user_ids': sorted(user_ids) if user_ids else None
+    }
+    return base64.urlsafe_b64encode(json.dumps(payload).encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(token):
+    """Return the position and filters stored in a resume token"""
+    payload = json.loads(base64.urlsafe_b64decode(token.strip().encode('ascii')))
+
+    def when(value):
+        return datetime.fromisoformat(value) if value else None
+
+    return {
+        'after': (when(payload['created_at']), payload['id']),
+        'start': when(payload['start']),
+        'end': when(payload['end']),
+        'user_ids': payload['user_ids']
+    }
+
+
+def _conversation_pages(db, start=None, end=None, user_ids=None, after=None, page_size=PAGE_SIZE):
+    """Yield conversations ordered by (created_at, id), one page in memory at a time.
+
+    created_at never changes, so the order is stable while the export runs and
+    a cursor taken in one part resumes exactly in the next. Conversations created
+    after `end`, or last updated before `start`, cannot hold messages in range
+    and are skipped by the query.
+    More users than an 'in' filter takes are queried in groups and merged.
+    """
+    def pages(group):
+        query = db.collection('conversations')
+        if group:
+            query = query.where('user_id', 'in', group)
+        if start:
+            query = query.where('updated_at', '>=', start)
+        if end:
+            query = query.where('created_at', '<', end)
+        query = query.order_by('created_at').order_by('__name__').select(['user_id', 'title', 'created_at'])
+
+        position = after
+        while True:
+            page = query
+            if position:
+                page = page.start_after({'created_at': position[0], '__name__': position[1]})
+            docs = list(page.limit(page_size).stream())
+            yield from docs
+            if len(docs) < page_size:
+                return
+            position = (docs[-1].get('created_at'), docs[-1].id)
+
+    if not user_ids:
+        return pages(None)
+    user_ids = list(user_ids)
+    groups = [user_ids[i:i + MAX_IN_FILTER] for i in range(0, len(user_ids), MAX_IN_FILTER)]
+    return heapq.merge(*(pages(group) for group in groups), key=lambda doc: (doc.get('created_at'), doc.id))
+
+
+def _message_pages(conv_ref, start=None, end=None, page_size=PAGE_SIZE):
+    """Yield a conversation's messages in timestamp order, a page at a time"""
+    query = conv_ref.collection('messages')
+    if start:
+        query = query.where('timestamp', '>=', start)
+    if end:
+        query = query.where('timestamp', '<', end)
+    query = query.order_by('timestamp').order_by('__name__')
+
+    cursor = None
+    while True:
+        page = query.start_after(cursor) if cursor else query
+        docs = list(page.limit(page_size).stream())
+        yield from docs
+        if len(docs) < page_size:
+            return
+        cursor = {'timestamp': docs[-1].get('timestamp'), '__name__': docs[-1].id}
+
+
+class _Writer:
+    """Write rows as CSV or JSON lines to a binary file, optionally gzipped"""
+
+    def __init__(self, fileobj, fmt, compress):
+        self.raw = gzip.GzipFile(fileobj=fileobj, mode='wb') if compress else None
+        self.text = io.TextIOWrapper(self.raw or fileobj, encoding='utf-8', newline='')
+        self.fmt = fmt
+        if fmt == 'csv':
+            self.csv = csv.DictWriter(self.text, fieldnames=EXPORT_FIELDS)
+            self.csv.writeheader()
+
+    def write(self, row):
+        if self.fmt == 'csv':
+            self.csv.writerow(row)
+        else:
+            self.text.write(json.dumps(row, ensure_ascii=False) + "\n")
+
+    def close(self):
+        self.text.flush()
+        self.text.detach()
+        if self.raw:
+            self.raw.close()
+
+
+def export_cohort(db, fileobj, fmt='csv', compress=False, start=None, end=None, user_ids=None,
+                  emails=None, tz=None, cursor=None, max_rows=MAX_ROWS_PER_PART, on_progress=None):
+    """Stream every message in range into `fileobj`, one row per message.
+
+    Conversations and messages are paged, so memory stays bounded whatever
+    the cohort size. A part ends at a conversation boundary once `max_rows`
+    rows are written; the returned cursor then resumes with the next
+    conversation, under the same filters. Passing a cursor overrides
+    start, end and user_ids with the ones it was created with.
+
+    on_progress(conversations, rows) is called after each conversation that
+    wrote rows. Returns the conversations and rows written and the resume cursor, which
+    is None once the export is complete.
+
+    The queries need the Firestore indexes listed in the README.
+    """
+    after = None
+    if cursor:
+        resume = decode_cursor(cursor)
+        after, start, end, user_ids = resume['after'], resume['start'], resume['end'], resume['user_ids']
+
+    emails = emails or {}
+    writer = _Writer(fileobj, fmt, compress)
+    conversations = rows = 0
+    next_cursor = None
+    try:
+        for conv in _conversation_pages(db, start, end, user_ids, after):
+            if rows >= max_rows:
+                next_cursor = encode_cursor(after, start, end, user_ids)
+                break
+
+            conv_data = conv.to_dict()
+            written = rows
+            for msg in _message_pages(conv.reference, start, end):
+                msg_data = msg.to_dict()
+                timestamp = msg_data.get('timestamp')
+                content = msg_data.get('content') or ''
+                writer.write({
+                    'user_id': conv_data.get('user_id'),
+                    'email': emails.get(conv_data.get('user_id'), ''),
+                    'conversation_id': conv.id,
+                    'conversation_title': conv_data.get('title') or '',
+                    'message_id': msg.id,
+                    'timestamp': (timestamp.astimezone(tz) if tz else timestamp).isoformat() if timestamp else '',
+                    'role': msg_data.get('role', ''),
+                    'content': content,
+                    'words': len(content.split())
+                })
+                rows += 1
+
+            after = (conv_data.get('created_at'), conv.id)
+            if rows > written:  # Count only conversations with messages in range
+                conversations += 1
+                if on_progress:
+                    on_progress(conversations, rows)
+    finally:
+        writer.close()
+
+    return {'conversations': conversations, 'rows': rows, 'cursor': next_cursor}
@@ -0,0 +1,211 @@
+# governor.py
+import asyncio
+import itertools
+import logging
+import random
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+
+import openai
+
+from prompts import message_tokens
+
+logger = logging.getLogger(__name__)
+
+# Lower numbers are granted first: a student waiting on the chat beats a
+# review, and both beat background title updates.
+PRIORITIES = {'chat': 0, 'review': 1, 'title': 2}
+RETRYABLE = (openai.RateLimitError, openai.APIConnectionError, openai.InternalServerError)
+BACKOFF_BASE = 1.0  # Seconds before the first retry, doubled each attempt
+BACKOFF_CAP = 30.0
+
+
+def request_tokens(messages, max_tokens):
+    """Tokens a completion counts against the TPM limit: the prompt plus max_tokens"""
+    return sum(message_tokens(message) for message in messages) + max_tokens
+
+
+class Ticket:
+    """A queued completion call; the future resolves once it may be sent"""
+
+    def __init__(self, user_id, tokens, priority, on_wait):
+        self.user_id = user_id
+        self.tokens = tokens
+        self.priority = priority
+        self.on_wait = on_wait
+        self.position = None
+        self.future = Future()
+
+
+class RateGovernor:
+    """Process-wide token buckets for OpenAI's request and token limits.
+
+    Every completion call (chat, review and title) takes a ticket first. A
+    dispatcher thread grants tickets while both the requests-per-minute and
+    tokens-per-minute buckets have room, highest priority first and round
+    robin across users within a priority, so one student's burst of review
+    calls cannot starve the rest of the class. Waiting callers are told their
+    place in the queue through on_wait(position).
+
+    Calls are retried with jittered exponential backoff on rate limit,
+    connection and server errors. A rate limit response also pauses all
+    grants until the server's retry-after has passed.
+    """
+
+    def __init__(self, rpm, tpm, max_retries=3):
+        self.rpm = rpm
+        self.tpm = tpm
+        self.max_retries = max_retries
+        self._requests = float(rpm)
+        self._tokens = float(tpm)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._changed = False  # Set when the queue or pause changes, to wake the dispatcher
+        self._queues = {}  # priority -> OrderedDict(user_id -> deque of tickets)
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name="rate-governor", daemon=True)
+        self._thread.start()
+
+    def call(self, fn, kind, tokens, user_id=None, on_wait=None):
+        """Run fn() once admitted, retrying it with backoff on transient errors"""
+        for attempt in itertools.count():
+            self._enqueue(kind, tokens, user_id, on_wait).future.result()
+            try:
+                return fn()
+            except RETRYABLE as e:
+                if attempt >= self.max_retries:
+                    raise
+                time.sleep(self._backoff(attempt, e))
+
+    async def call_async(self, coro_fn, kind, tokens, user_id=None, on_wait=None):
+        """call() for coroutines; waiting in the queue does not block the event loop"""
+        for attempt in itertools.count():
+            ticket = self._enqueue(kind, tokens, user_id, on_wait)
+            try:
+                await asyncio.wrap_future(ticket.future)
+            except asyncio.CancelledError:
+                self._cancel(ticket)
+                raise
+            try:
+                return await coro_fn()
+            except RETRYABLE as e:
+                if attempt >= self.max_retries:
+                    raise
+                await asyncio.sleep(self._backoff(attempt, e))
+
+    def pause(self, seconds):
+        """Hold every grant for `seconds`, e.g. after the API reports a rate limit"""
+        with self._cond:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+            self._changed = True
+            self._cond.notify()
+
+    def _backoff(self, attempt, error):
+        delay = random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt))
+        if isinstance(error, openai.RateLimitError):
+            retry_after = error.response.headers.get('retry-after') if error.response is not None else None
+            try:
+                delay = max(delay, float(retry_after))
+            except (TypeError, ValueError):
+                pass
+            self.pause(delay)
+        logger.warning("OpenAI call failed (%s), retrying in %.1fs", type(error).__name__, delay)
+        return delay
+
+    def _enqueue(self, kind, tokens, user_id, on_wait):
+        # A call larger than the whole bucket still goes through once it is full
+        ticket = Ticket(user_id, min(tokens, self.tpm), PRIORITIES[kind], on_wait)
+        with self._cond:
+            self._queues.setdefault(ticket.priority, OrderedDict())\
+                .setdefault(user_id, deque()).append(ticket)
+            self._changed = True
+            self._cond.notify()
+        return ticket
+
+    def _cancel(self, ticket):
+        with self._cond:
+            users = self._queues.get(ticket.priority, {})
+            if ticket in users.get(ticket.user_id, ()):
+                self._remove(ticket)
+                self._changed = True
+                self._cond.notify()
+            elif not ticket.future.cancelled():
+                # Granted but never used; give its budget back. A cancelled
+                # future was dropped by the dispatcher without being charged.
+                self._requests = min(self.rpm, self._requests + 1)
+                self._tokens = min(self.tpm, self._tokens + ticket.tokens)
+
+    def _remove(self, ticket):
+        users = self._queues[ticket.priority]
+        users[ticket.user_id].remove(ticket)
+        if users[ticket.user_id]:
+            users.move_to_end(ticket.user_id)  # Round robin: the user goes to the back
+        else:
+            del users[ticket.user_id]
+        if not users:
+            del self._queues[ticket.priority]
+
+    def _ordered(self):
+        """Queued tickets in the order they will be granted"""
+        order = []
+        for priority in sorted(self._queues):
+            for turn in itertools.zip_longest(*self._queues[priority].values()):
+                order.extend(ticket for ticket in turn if ticket is not None)
+        return order
+
+    def _refill(self, now):
+        elapsed = now - self._updated
+        self._updated = now
+        self._requests = min(self.rpm, self._requests + elapsed * self.rpm / 60)
+        self._tokens = min(self.tpm, self._tokens + elapsed * self.tpm / 60)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._queues:
+                    self._cond.wait()
+                self._changed = False
+                now = time.monotonic()
+                self._refill(now)
+                order = self._ordered()
+                ticket = order[0]
+
+                wait = max(
+                    self._paused_until - now,
+                    (1 - self._requests) * 60 / self.rpm,
+                    (ticket.tokens - self._tokens) * 60 / self.tpm
+                )
+                granted = None
+                if wait <= 0:
+                    self._remove(ticket)
+                    order = self._ordered()
+                    # False if its caller gave up while it was queued
+                    if ticket.future.set_running_or_notify_cancel():
+                        self._requests -= 1
+                        self._tokens -= ticket.tokens
+                        granted = ticket
+                updates = self._positions(order)
+
+            if granted:
+                granted.future.set_result(None)
+            for waiting, position in updates:
+                try:
+                    waiting.on_wait(position)
+                except Exception:
+                    logger.exception("Queue position callback failed")
+
+            if wait > 0:
+                with self._cond:
+                    if not self._changed:  # Nothing arrived while the callbacks ran
+                        self._cond.wait(wait)
+
+    def _positions(self, order):
+        """Tickets whose queue position changed, to report outside the lock"""
+        updates = []
+        for position, ticket in enumerate(order, start=1):
+            if ticket.on_wait and ticket.position != position:
+                ticket.position = position
+                updates.append((ticket, position))
+        return updates
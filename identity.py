@@ -0,0 +1,61 @@
+# identity.py
+import requests
+from requests.adapters import HTTPAdapter
+from firebase_admin import auth
+
+SIGN_IN_URL = "https://identitytoolkit.googleapis.com/v1/accounts:signInWithPassword"
+REFRESH_URL = "https://securetoken.googleapis.com/v1/token"
+REQUEST_TIMEOUT = 10  # Seconds for each Firebase Auth REST call
+POOL_SIZE = 20        # Keep-alive connections shared by every session
+CLOCK_SKEW_SECONDS = 10  # Tolerated drift between our clock and the token's iat/exp
+
+
+class AuthError(Exception):
+    pass
+
+
+class SignedInUser:
+    """The signed-in user as the app needs it: uid, email and a refresh token"""
+
+    def __init__(self, uid, email, refresh_token=None):
+        self.uid = uid
+        self.email = email
+        self.refresh_token = refresh_token
+
+
+class IdentityClient:
+    """Firebase Auth REST calls over one pooled keep-alive session.
+
+    Sign-in is a single round trip: the uid and email come from the ID token
+    in the response, which is verified locally. firebase_admin caches Google's
+    public signing keys for as long as their Cache-Control allows, so
+    verification normally needs no network call. A refresh token from an
+    earlier sign-in can be exchanged for a new ID token instead of asking for
+    the password again.
+    """
+
+    def __init__(self, api_key, pool_size=POOL_SIZE):
+        self.api_key = api_key
+        self.session = requests.Session()
+        self.session.mount("https://", HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size))
+
+    def sign_in(self, email, password):
+        data = self._post(SIGN_IN_URL, json={"email": email, "password": password, "returnSecureToken": True})
+        return self._user(data['idToken'], data['localId'], data.get('refreshToken'))
+
+    def refresh(self, refresh_token):
+        """Sign in again from a refresh token; the returned user carries its replacement"""
+        data = self._post(REFRESH_URL, data={"grant_type": "refresh_token", "refresh_token": refresh_token})
+        return self._user(data['id_token'], data['user_id'], data.get('refresh_token'))
+
+    def _post(self, url, **kwargs):
+        response = self.session.post(url, params={"key": self.api_key}, timeout=REQUEST_TIMEOUT, **kwargs)
+        if response.status_code != 200:
+            raise AuthError(f"Authentication failed ({response.status_code})")
+        return response.json()
+
+    def _user(self, id_token, uid, refresh_token):
+        claims = auth.verify_id_token(id_token, clock_skew_seconds=CLOCK_SKEW_SECONDS)
+        if claims['uid'] != uid:
+            raise AuthError("ID token does not match the signed-in user")
+        return SignedInUser(claims['uid'], claims.get('email'), refresh_token)
@@ -0,0 +1,81 @@
+# metrics.py
+import logging
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+import pytz
+
+logger = logging.getLogger(__name__)
+
+TZ = pytz.timezone("Europe/London")
+
+
+class StageTimer:
+    """Wall-clock time spent in each stage of a chat turn, in milliseconds.
+
+    Spans with the same name add up, so a stage entered twice is reported
+    once. Spans measured elsewhere (such as the time to first token) can be
+    recorded with mark().
+    """
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.spans = {}
+
+    @contextmanager
+    def span(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.mark(name, time.perf_counter() - start)
+
+    def mark(self, name, seconds):
+        if seconds is not None:
+            self.spans[name] = self.spans.get(name, 0) + round(seconds * 1000)
+
+    def finish(self):
+        """Record the total since the timer started and return all spans"""
+        self.spans['total'] = round((time.perf_counter() - self.start) * 1000)
+        return dict(self.spans)
+
+
+def usage_dict(usage):
+    """Prompt, completion and cached prompt token counts from response.usage"""
+    if usage is None:
+        return None
+    details = getattr(usage, 'prompt_tokens_details', None)
+    return {
+        'prompt_tokens': usage.prompt_tokens,
+        'completion_tokens': usage.completion_tokens,
+        'cached_tokens': (getattr(details, 'cached_tokens', None) or 0)
+    }
+
+
+def record_metrics(db, kind, user_id, conversation_id, spans, usage=None, **fields):
+    """Write one compact turn_metrics document.
+
+    `kind` is 'turn' for a chat turn or 'title' for a title update. `usage`
+    is a dict of prompt, completion and cached token counts. Metrics are
+    best effort, so errors are logged rather than raised.
+    """
+    now = datetime.now(TZ)
+    usage = usage or {}
+    try:
+        db.collection('turn_metrics').document().set({
+            'kind': kind,
+            'user_id': user_id,
+            'conversation_id': conversation_id,
+            'day': now.strftime('%Y-%m-%d'),
+            'created_at': now,
+            'spans': spans,
+            'tokens': {
+                'prompt': usage.get('prompt_tokens', 0),
+                'completion': usage.get('completion_tokens', 0),
+                'cached': usage.get('cached_tokens', 0)
+            },
+            **fields
+        })
+    except Exception:
+        logger.exception("Recording %s metrics failed", kind)
@@ -1,17 +1,90 @@
 import streamlit as st
 from firebase_admin import firestore, auth
-from datetime import datetime
+from datetime import datetime, timedelta
+import os
+import tempfile
+import weakref
 import pytz
 import pandas as pd
 
+from export import export_cohort, EXPORT_FORMATS
+from rollups import message_frame, median_gap
+from store import (backfill_conversation_stats, backfill_last_active, backfill_rollups, read_counter,
+                   delete_conversation_tree, delete_conversations, MAX_BATCH_WRITES)
+from resources import get_db
+
+METRICS_TTL = 60  # Seconds the dashboard metrics row is cached for
+PERFORMANCE_DAYS = 7  # Days of turn metrics shown in the performance panel
+STAGES = ['build', 'cache_lookup', 'ttft', 'llm', 'save_user', 'save_assistant', 'total']
+
+
+@st.cache_data(ttl=METRICS_TTL, show_spinner=False)
+def load_metrics(_db, today):
+    """Dashboard metrics from aggregation queries and sharded counters"""
+    week_start = datetime.combine(today - timedelta(days=today.weekday()), datetime.min.time())
+    week_start = pytz.timezone("Europe/London").localize(week_start)
+
+    def count(query):
+        return query.count().get()[0][0].value
+
+    return {
+        'users': count(_db.collection('users')),
+        'conversations': count(_db.collection('conversations')),
+        'messages_today': read_counter(_db, f"daily_{today.isoformat()}", 'messages'),
+        'active_this_week': count(_db.collection('users').where('last_active_at', '>=', week_start)),
+        'reviews_requested': read_counter(_db, 'totals', 'reviews_requested')
+    }
+
+
+@st.cache_data(ttl=METRICS_TTL, show_spinner=False)
+def load_turn_metrics(_db, since):
+    """Chat turn metrics recorded since `since`, one row per turn"""
+    docs = _db.collection('turn_metrics')\
+        .where('created_at', '>=', since)\
+        .select(['kind', 'user_id', 'day', 'spans', 'tokens'])\
+        .stream()
+    return pd.json_normalize([doc.to_dict() for doc in docs])
+
+
+@st.cache_data(ttl=METRICS_TTL, show_spinner=False)
+def load_rollups(_db, since_day):
+    """Per-user, per-day rollup documents from since_day onwards"""
+    docs = _db.collection('user_rollups').where('day', '>=', since_day).stream()
+    return pd.json_normalize([doc.to_dict() for doc in docs])
+
+
+def _remove_file(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+class ExportFile:
+    """An export part on disk, deleted when the next part replaces it, when the
+    admin's session is discarded, or at the latest when the server exits"""
+
+    def __init__(self, path):
+        self.path = path
+        self._cleanup = weakref.finalize(self, _remove_file, path)
+
+    def remove(self):
+        self._cleanup()
+
+
 class AdminDashboard:
     def __init__(self):
-        self.db = firestore.client()
+        self.db = get_db()
         self.tz = pytz.timezone("Europe/London")
+        self.conversations_per_page = 10  # Number of conversations per page
         if 'selected_conversations' not in st.session_state:
             st.session_state.selected_conversations = set()
         if 'show_batch_delete' not in st.session_state:
             st.session_state.show_batch_delete = False
+        if 'open_conversations' not in st.session_state:
+            st.session_state.open_conversations = set()
+        if 'conversation_rows' not in st.session_state:
+            st.session_state.conversation_rows = {}
     
     def handle_selection(self, conv_id, is_selected):
         """Handle conversation selection without triggering rerun"""
@@ -30,56 +103,42 @@ class AdminDashboard:
             st.session_state.selected_conversations = all_ids
         st.session_state.show_batch_delete = len(st.session_state.selected_conversations) > 0
 
-    def get_last_login_from_chat(self, user_id):
-        """Get user's last login time from their most recent chat message"""
-        try:
-            # Only get the most recent conversation using orderBy and limit(1)
-            latest_conv = self.db.collection('conversations')\
-                .where('user_id', '==', user_id)\
-                .order_by('updated_at', direction=firestore.Query.DESCENDING)\
-                .limit(1)\
-                .stream()
-        
-            # Convert to list to check if any conversations exist
-            latest_conv = list(latest_conv)
-            if not latest_conv:
-                return None
-
-            # Use the updated_at timestamp from the conversation document
-            conv_data = latest_conv[0].to_dict()
-            return conv_data.get('updated_at')
-
-        except Exception as e:
-            st.error(f"Error getting last login: {e}")
-            return None
+    def user_document_data(self, user):
+        """Firestore users document for an Authentication user"""
+        return {
+            'email': user.email,
+            'role': 'user',
+            'created_at': firestore.SERVER_TIMESTAMP                
+        }
 
-    def create_user_document(self, user):
-        """Create or update user document in Firestore"""
-        try:
-            user_data = {
-                'email': user.email,
-                'role': 'user',
-                'created_at': firestore.SERVER_TIMESTAMP                
-            }
-            
-            self.db.collection('users').document(user.uid).set(user_data)
-            return True
-        except Exception as e:
-            st.error(f"Error creating user document: {e}")
-            return False
-            
     def sync_users(self):
-        """Sync Authentication users with Firestore users collection"""
+        """Sync Authentication users with Firestore users collection.
+
+        Works one Auth page (up to 1000 users) at a time: existing documents are
+        read with a single get_all per chunk and missing ones written in batches.
+        """
         try:
-            auth_users = auth.list_users().iterate_all()
+            users_ref = self.db.collection('users')
             synced_count = 0
+            page = auth.list_users()
             
-            for auth_user in auth_users:
-                user_doc = self.db.collection('users').document(auth_user.uid).get()
-                
-                if not user_doc.exists:
-                    self.create_user_document(auth_user)
-                    synced_count += 1
+            while page:
+                for start in range(0, len(page.users), MAX_BATCH_WRITES):
+                    chunk = page.users[start:start + MAX_BATCH_WRITES]
+                    docs = self.db.get_all([users_ref.document(user.uid) for user in chunk],
+                                           field_paths=['email'])
+                    # Chat activity can create a bare document holding only last_active_at
+                    synced = {doc.id for doc in docs if doc.exists and 'email' in doc.to_dict()}
+
+                    batch = self.db.batch()
+                    missing = [user for user in chunk if user.uid not in synced]
+                    for user in missing:
+                        batch.set(users_ref.document(user.uid), self.user_document_data(user), merge=True)
+                    if missing:
+                        batch.commit()
+                        synced_count += len(missing)
+
+                page = page.get_next_page()
             
             return synced_count
         except Exception as e:
@@ -101,9 +160,8 @@ class AdminDashboard:
     def delete_conversation(self, conversation_id):
         """Delete a single conversation and all its messages"""
         try:
-            messages_ref = self.db.collection('conversations').document(conversation_id).collection('messages')
-            self._batch_delete(messages_ref)
-            self.db.collection('conversations').document(conversation_id).delete()
+            delete_conversation_tree(self.db, conversation_id)
+            self._forget_conversations([conversation_id])
             return True
         except Exception as e:
             st.error(f"Error deleting conversation: {e}")
@@ -112,10 +170,11 @@ class AdminDashboard:
     def delete_user_conversations(self, user_id):
         """Delete all conversations for a specific user"""
         try:
-            conversations = self.db.collection('conversations').where('user_id', '==', user_id).stream()
-            for conv in conversations:
-                self.delete_conversation(conv.id)
-            return True
+            conversations = self.db.collection('conversations')\
+                .where('user_id', '==', user_id)\
+                .select([])\
+                .stream()
+            return self._delete_with_progress([conv.id for conv in conversations])
         except Exception as e:
             st.error(f"Error deleting user conversations: {e}")
             return False
@@ -123,22 +182,130 @@ class AdminDashboard:
     def delete_multiple_conversations(self, conversation_ids):
         """Delete multiple conversations"""
         try:
-            for conv_id in conversation_ids:
-                self.delete_conversation(conv_id)
-            return True
+            deleted = self._delete_with_progress(list(conversation_ids))
+            st.session_state.show_batch_delete = len(st.session_state.selected_conversations) > 0
+            return deleted
         except Exception as e:
             st.error(f"Error deleting conversations: {e}")
             return False
 
-    def _batch_delete(self, collection_ref, batch_size=100):
-        """Helper method to delete collection in batches"""
-        docs = collection_ref.limit(batch_size).stream()
-        deleted = 0
-        for doc in docs:
-            doc.reference.delete()
-            deleted += 1
-        if deleted >= batch_size:
-            return self._batch_delete(collection_ref, batch_size)
+    def _delete_with_progress(self, conversation_ids):
+        """Run the bulk deletion engine, reporting progress to the page"""
+        if not conversation_ids:
+            return True
+
+        progress = st.progress(0.0, text="Deleting conversations...")
+
+        def report(done, total, messages):
+            progress.progress(done / total, text=f"Deleted {done}/{total} conversations ({messages} messages)")
+
+        result = delete_conversations(self.db, conversation_ids, on_progress=report)
+        self._forget_conversations(conversation_ids)
+        st.toast(f"Deleted {result['conversations']} conversations and {result['messages']} messages")
+        return True
+
+    def _forget_conversations(self, conversation_ids):
+        """Drop deleted conversations from the page's session caches"""
+        for conv_id in conversation_ids:
+            st.session_state.open_conversations.discard(conv_id)
+            st.session_state.conversation_rows.pop(conv_id, None)
+            st.session_state.selected_conversations.discard(conv_id)
+
+    def get_user_conversations(self, user_id):
+        """Get one page of a user's conversation metadata, newest first.
+
+        Returns the page and whether another page follows.
+        """
+        if st.session_state.get('admin_page_user') != user_id:
+            st.session_state.admin_page_user = user_id
+            st.session_state.admin_page = 0
+            st.session_state.admin_page_cursors = []
+
+        query = self.db.collection('conversations')\
+            .where('user_id', '==', user_id)\
+            .order_by('updated_at', direction=firestore.Query.DESCENDING)\
+            .order_by('__name__', direction=firestore.Query.DESCENDING)
+        if st.session_state.admin_page > 0:
+            query = query.start_after(st.session_state.admin_page_cursors[st.session_state.admin_page - 1])
+
+        conversations = list(query.limit(self.conversations_per_page + 1).stream())
+        return conversations[:self.conversations_per_page], len(conversations) > self.conversations_per_page
+
+    def load_conversation_rows(self, conversation_id):
+        """Fetch a conversation's messages as table rows, once per session"""
+        if conversation_id in st.session_state.conversation_rows:
+            return st.session_state.conversation_rows[conversation_id]
+
+        messages = self.db.collection('conversations').document(conversation_id)\
+                  .collection('messages')\
+                  .order_by('timestamp')\
+                  .stream()
+
+        # Gaps come from real timestamps, so they hold across midnight
+        frame = message_frame((msg.to_dict() for msg in messages), self.tz)
+        detailed_data = pd.DataFrame({
+            'date': frame['timestamp'].dt.strftime('%Y-%m-%d').fillna('N/A'),
+            'time': frame['timestamp'].dt.strftime('%H:%M:%S').fillna('N/A'),
+            'role': frame['role'].fillna('N/A'),
+            'content': frame['content'].fillna(''),
+            'length': frame['words'],
+            'response_time': frame['gap_seconds'].round()
+        }).to_dict('records')
+
+        st.session_state.conversation_rows[conversation_id] = detailed_data
+        return detailed_data
+
+    def render_conversation(self, conv_id, conv_title, is_open):
+        """Render a conversation's messages, fetching them only once it is opened"""
+        if not is_open:
+            if st.button("Load Messages", key=f"open_{conv_id}"):
+                st.session_state.open_conversations.add(conv_id)
+                st.rerun()
+            return
+
+        detailed_data = self.load_conversation_rows(conv_id)
+        
+        if detailed_data:
+            st.dataframe(
+                detailed_data,
+                column_config={
+                    "date": "Date",
+                    "time": "Time",
+                    "role": "Role",
+                    "content": "Content",
+                    "length": st.column_config.NumberColumn(
+                        "Length",
+                        help="Number of words"
+                    ),
+                    "response_time": st.column_config.NumberColumn(
+                        "Response Time (s)",
+                        help="Time since previous message in seconds"
+                    )
+                },
+                hide_index=True,
+                key=f"dataframe_{conv_id}"
+            )
+
+            # Create columns for buttons at the bottom
+            col1, col2 = st.columns([5,1])
+            with col1:
+                # Build the CSV only when asked for
+                if st.button("Prepare CSV Download", key=f"prepare_{conv_id}"):
+                    df = pd.DataFrame(detailed_data)
+                    csv = df.to_csv(index=False).encode('utf-8')
+                    st.download_button(
+                        label="Download Chat Log as CSV",
+                        data=csv,
+                        file_name=f"{conv_title}_chat_log.csv",
+                        mime="text/csv",
+                        key=f"download_{conv_id}"
+                    )
+            with col2:
+                if st.button("Delete", key=f"delete_{conv_id}", type="primary"):
+                    if self.delete_conversation(conv_id):
+                        st.rerun()
+        else:
+            st.info("No messages found for this essay.")
 
     def format_timestamp(self, timestamp):
         """Helper method to format timestamp consistently"""
@@ -149,6 +316,147 @@ class AdminDashboard:
                 return 'N/A'
         return 'N/A'
     
+    def render_cohort(self, users):
+        """Cohort activity per day and per user, read from the daily rollups"""
+        st.subheader("Cohort Analytics")
+        since = datetime.now(self.tz).date() - timedelta(days=PERFORMANCE_DAYS - 1)
+        rollups = load_rollups(self.db, since.isoformat())
+        if rollups.empty:
+            st.info("No rollups yet. Use Rebuild Analytics Rollups to build them from existing conversations.")
+            return
+
+        fields = ['messages', 'user_messages', 'user_words', 'reviews_requested', 'gap_count', 'gap_seconds']
+        gaps = [column for column in rollups if column.startswith('response_gaps.')]
+        rollups = rollups.reindex(columns=rollups.columns.union(fields))
+
+        def summarise(grouped):
+            summary = grouped[fields + gaps].sum()
+            summary['median_gap_s'] = median_gap(summary)
+            summary['mean_gap_s'] = (summary['gap_seconds'] / summary['gap_count']).round()
+            return summary[['messages', 'user_messages', 'user_words', 'reviews_requested',
+                            'median_gap_s', 'mean_gap_s']]
+
+        daily = summarise(rollups.groupby('day'))
+        daily.insert(0, 'active_users', rollups.groupby('day')['user_id'].nunique())
+        st.caption(f"Per day, last {PERFORMANCE_DAYS} days (median gap is the upper bound of its bucket)")
+        st.dataframe(daily.sort_index(ascending=False), use_container_width=True)
+
+        per_user = summarise(rollups.groupby('user_id'))
+        emails = {user['id']: user['email'] for user in users}
+        per_user.index = [emails.get(user_id, user_id) for user_id in per_user.index]
+        st.caption("Per user")
+        st.dataframe(per_user.sort_values('messages', ascending=False), use_container_width=True)
+
+    def render_performance(self, users):
+        """Latency percentiles per stage and token spend per day and per user.
+
+        Every turn_metrics document in the window is read, so the panel loads
+        only when asked for rather than on each dashboard rerun.
+        """
+        st.subheader("Performance")
+        if not st.checkbox(f"Load turn metrics for the last {PERFORMANCE_DAYS} days", key="show_performance"):
+            return
+        since = datetime.combine(datetime.now(self.tz).date() - timedelta(days=PERFORMANCE_DAYS - 1), datetime.min.time())
+        metrics = load_turn_metrics(self.db, self.tz.localize(since))
+        if metrics.empty:
+            st.info("No turn metrics recorded yet.")
+            return
+
+        tokens = ['tokens.prompt', 'tokens.completion', 'tokens.cached']
+        spans = [f'spans.{stage}' for stage in STAGES]
+        metrics = metrics.reindex(columns=metrics.columns.union(spans + tokens))  # Stages a turn skipped are NaN
+        turns = metrics[metrics['kind'] == 'turn']
+
+        st.caption(f"Chat turn latency (ms), last {PERFORMANCE_DAYS} days")
+        latency = turns[spans].quantile([0.5, 0.95]).T
+        latency.index = STAGES
+        latency.columns = ['p50', 'p95']
+        st.dataframe(latency.round(), use_container_width=True)
+
+        daily = turns.groupby('day').agg(
+            turns=('spans.total', 'size'),
+            p50_ms=('spans.total', 'median'),
+            p95_ms=('spans.total', lambda total: total.quantile(0.95)),
+            p50_ttft_ms=('spans.ttft', 'median')
+        )
+
+        # Token spend includes title generation
+        spend = metrics.groupby('day')[tokens].sum()
+        spend.columns = ['prompt_tokens', 'completion_tokens', 'cached_tokens']
+        st.caption("Per day")
+        st.dataframe(daily.join(spend, how='outer').sort_index(ascending=False), use_container_width=True)
+
+        emails = {user['id']: user['email'] for user in users}
+        per_user = metrics.groupby('user_id').agg(
+            turns=('kind', lambda kind: int((kind == 'turn').sum())),
+            prompt_tokens=('tokens.prompt', 'sum'),
+            completion_tokens=('tokens.completion', 'sum'),
+            cached_tokens=('tokens.cached', 'sum')
+        )
+        per_user.index = [emails.get(user_id, user_id) for user_id in per_user.index]
+        st.caption("Per user")
+        st.dataframe(per_user.sort_values('prompt_tokens', ascending=False), use_container_width=True)
+
+    def render_export(self, users):
+        """Export the cohort's chat logs to one file, in resumable parts"""
+        st.subheader("Cohort Export")
+        emails = {user['id']: user['email'] for user in users}
+        today = datetime.now(self.tz).date()
+
+        with st.form("cohort_export"):
+            cols = st.columns([2, 1, 1])
+            dates = cols[0].date_input("Date range", value=(today - timedelta(days=30), today))
+            fmt = cols[1].selectbox("Format", list(EXPORT_FORMATS))
+            compress = cols[2].checkbox("Gzip", value=True)
+            user_ids = st.multiselect("Users (all if none selected)", options=list(emails), format_func=emails.get)
+            cursor = st.text_input("Resume cursor", value=st.session_state.get('export_cursor') or '',
+                                   help="Continues a previous export with its original filters")
+            submitted = st.form_submit_button("Run Export")
+
+        if submitted:
+            start = self.tz.localize(datetime.combine(dates[0], datetime.min.time())) if dates else None
+            end = self.tz.localize(datetime.combine(dates[-1] + timedelta(days=1), datetime.min.time())) if dates else None
+            extension = EXPORT_FORMATS[fmt] + ('.gz' if compress else '')
+            previous = st.session_state.get('export_result')
+            part = previous['part'] + 1 if previous and cursor else 1
+
+            progress = st.empty()
+
+            def report(conversations, rows):
+                progress.caption(f"Exported {rows} messages from {conversations} conversations...")
+
+            # Rows go straight to a temporary file rather than being built up in memory
+            with tempfile.NamedTemporaryFile(suffix=f".{extension}", delete=False) as out:
+                part_file = ExportFile(out.name)
+                try:
+                    result = export_cohort(self.db, out, EXPORT_FORMATS[fmt], compress, start, end, user_ids,
+                                           emails=emails, tz=self.tz, cursor=cursor or None, on_progress=report)
+                except Exception as e:
+                    # A malformed resume cursor or a missing index; the previous part is kept
+                    result = None
+                    st.error(f"Error exporting conversations: {e}")
+            progress.empty()
+
+            if result is None:
+                part_file.remove()
+            else:
+                if previous:
+                    previous['file'].remove()
+                st.session_state.export_result = {**result, 'file': part_file, 'part': part,
+                                                  'file_name': f"cohort_export_part{part}.{extension}"}
+                st.session_state.export_cursor = result['cursor']
+
+        result = st.session_state.get('export_result')
+        if result:
+            st.success(f"Part {result['part']}: {result['rows']} messages from {result['conversations']} conversations")
+            with open(result['file'].path, 'rb') as export_file:
+                st.download_button("Download Export", data=export_file, file_name=result['file_name'],
+                                   mime="application/gzip" if result['file_name'].endswith('.gz') else "text/plain",
+                                   key="download_export")
+            if result['cursor']:
+                st.info("More conversations remain. Run the export again to write the next part from this cursor.")
+                st.code(result['cursor'])
+
     def render_dashboard(self):
         st.title("Admin Dashboard")
         
@@ -159,18 +467,40 @@ class AdminDashboard:
                 st.success(f"Successfully synced {synced_count} new users to Firestore")
             else:
                 st.info("All users are already synced")
+
+        # Backfill conversation counters for conversations saved before they existed
+        if st.button("Backfill Conversation Stats", key="backfill_stats_btn"):
+            try:
+                updated = backfill_conversation_stats(self.db)
+                st.success(f"Backfilled {updated} conversations")
+            except Exception as e:
+                st.error(f"Error backfilling conversations: {e}")
+
+        if st.button("Backfill Last Active", key="backfill_last_active_btn"):
+            try:
+                updated = backfill_last_active(self.db)
+                st.success(f"Backfilled last active time for {updated} users")
+            except Exception as e:
+                st.error(f"Error backfilling last active: {e}")
+
+        if st.button("Rebuild Analytics Rollups", key="rebuild_rollups_btn"):
+            try:
+                written = backfill_rollups(self.db, self.tz)
+                load_rollups.clear()
+                st.success(f"Rebuilt {written} daily rollups")
+            except Exception as e:
+                st.error(f"Error rebuilding rollups: {e}")
         
-        # Get counts for metrics
-        users_count = len(list(self.db.collection('users').get()))
-        convs = list(self.db.collection('conversations').get())
-        convs_count = len(convs)
+        # Metrics come from server-side aggregations, cached briefly
+        metrics = load_metrics(self.db, datetime.now(self.tz).date())
         
         # Display metrics
-        col1, col2 = st.columns(2)
-        with col1:
-            st.metric("Total Users", users_count)
-        with col2:
-            st.metric("Total Conversations", convs_count)
+        cols = st.columns(5)
+        cols[0].metric("Total Users", metrics['users'])
+        cols[1].metric("Total Conversations", metrics['conversations'])
+        cols[2].metric("Messages Today", metrics['messages_today'])
+        cols[3].metric("Active This Week", metrics['active_this_week'])
+        cols[4].metric("Reviews Requested", metrics['reviews_requested'])
                
         # User Management
         st.subheader("User Management")
@@ -181,14 +511,11 @@ class AdminDashboard:
         for doc in users_ref:
             user_data = doc.to_dict()
     
-            # Get last login from chat history
-            last_login = self.get_last_login_from_chat(doc.id)
-    
             users.append({
                 "id": doc.id,
                 "email": user_data.get('email', 'N/A'),
                 "role": user_data.get('role', 'N/A'),
-                "last_login": self.format_timestamp(last_login)
+                "last_login": self.format_timestamp(user_data.get('last_active_at'))
         })
         
          # Create user table with processed data
@@ -201,6 +528,10 @@ class AdminDashboard:
         else:
             st.info("No users found in the database.")
         
+        self.render_cohort(users)
+        self.render_performance(users)
+        self.render_export(users)
+
         # Essay History
         st.subheader("Essay History")
         selected_email = st.selectbox(
@@ -229,11 +560,8 @@ class AdminDashboard:
                         st.session_state.confirm_delete_all = True
                         st.warning("Are you sure? Click again to confirm deletion of ALL conversations.")
 
-                # Get conversations
-                conversations = list(self.db.collection('conversations')
-                                  .where('user_id', '==', selected_user['id'])
-                                  .order_by('updated_at', direction=firestore.Query.DESCENDING)
-                                  .stream())
+                # Get one page of conversation metadata
+                conversations, has_more = self.get_user_conversations(selected_user['id'])
 
                 # Show batch operations controls in a fixed position
                 if st.session_state.show_batch_delete:
@@ -279,91 +607,26 @@ class AdminDashboard:
                             pass  # Selection handled in on_change callback
                     
                     with col2:
-                        with st.expander(f"View Essay: {conv_title}", expanded=True):
-                            messages = self.db.collection('conversations').document(conv.id)\
-                                      .collection('messages')\
-                                      .order_by('timestamp')\
-                                      .stream()
-                            
-                            detailed_data = []
-                            prev_msg_time = None
-                            
-                            for msg in messages:
-                                msg_data = msg.to_dict()
-                                timestamp = msg_data.get('timestamp')
-                                
-                                if timestamp:
-                                    date = timestamp.astimezone(self.tz).strftime('%Y-%m-%d')
-                                    time = timestamp.astimezone(self.tz).strftime('%H:%M:%S')
-                                    
-                                    if prev_msg_time:
-                                        curr_seconds = int(time.split(':')[0]) * 3600 + \
-                                                     int(time.split(':')[1]) * 60 + \
-                                                     int(time.split(':')[2])
-                                        prev_seconds = int(prev_msg_time.split(':')[0]) * 3600 + \
-                                                     int(prev_msg_time.split(':')[1]) * 60 + \
-                                                     int(prev_msg_time.split(':')[2])
-                                        response_time = curr_seconds - prev_seconds
-                                    else:
-                                        response_time = 'N/A'
-                                        
-                                    prev_msg_time = time
-                                else:
-                                    date = 'N/A'
-                                    time = 'N/A'
-                                    response_time = 'N/A'
-                                    
-                                content = msg_data.get('content', '')
-                                word_count = len(content.split()) if content else 0
-                                
-                                detailed_data.append({
-                                    'date': date,
-                                    'time': time,
-                                    'role': msg_data.get('role', 'N/A'),
-                                    'content': content,
-                                    'length': word_count,
-                                    'response_time': response_time
-                                })
-                            
-                            if detailed_data:
-                                st.dataframe(
-                                    detailed_data,
-                                    column_config={
-                                        "date": "Date",
-                                        "time": "Time",
-                                        "role": "Role",
-                                        "content": "Content",
-                                        "length": st.column_config.NumberColumn(
-                                            "Length",
-                                            help="Number of words"
-                                        ),
-                                        "response_time": st.column_config.NumberColumn(
-                                            "Response Time (s)",
-                                            help="Time since previous message in seconds"
-                                        )
-                                    },
-                                    hide_index=True,
-                                    key=f"dataframe_{conv.id}"
-                                )
-                                
-                                # Create columns for buttons at the bottom
-                                col1, col2 = st.columns([5,1])
-                                with col1:
-                                    df = pd.DataFrame(detailed_data)
-                                    csv = df.to_csv(index=False).encode('utf-8')
-                                    st.download_button(
-                                        label="Download Chat Log as CSV",
-                                        data=csv,
-                                        file_name=f"{conv_title}_chat_log.csv",
-                                        mime="text/csv",
-                                        key=f"download_{conv.id}"
-                                    )
-                                with col2:
-                                    if st.button("Delete", key=f"delete_{conv.id}", type="primary"):
-                                        if self.delete_conversation(conv.id):
-                                            st.rerun()
-                            else:
-                                st.info("No messages found for this essay.")
+                        is_open = conv.id in st.session_state.open_conversations
+                        with st.expander(f"View Essay: {conv_title}", expanded=is_open):
+                            self.render_conversation(conv.id, conv_title, is_open)
+
+                # Pagination controls
+                cols = st.columns(2)
+                with cols[0]:
+                    if st.session_state.admin_page > 0:
+                        if st.button("Previous", key="admin_prev"):
+                            st.session_state.admin_page -= 1
+                            st.rerun()
+                with cols[1]:
+                    if has_more:
+                        if st.button("Next", key="admin_next"):
+                            last = conversations[-1]
+                            cursors = st.session_state.admin_page_cursors[:st.session_state.admin_page]
+                            cursors.append({'updated_at': last.get('updated_at'), '__name__': last.id})
+                            st.session_state.admin_page_cursors = cursors
+                            st.session_state.admin_page += 1
+                            st.rerun()
 
 def main():
     st.set_page_config(
@@ -0,0 +1,107 @@
+# prompts.py
+import hashlib
+import math
+import re
+
+from reviewprocess import MODULE_LEARNING_OBJECTIVES, MODULE_SYLLABUS, SYSTEM_INSTRUCTIONS, REVIEW_INSTRUCTIONS, SCORING_CRITERIA
+
+# Offline token estimate: roughly 4 characters per token for English text,
+# plus the fixed per-message overhead of the chat format.
+CHARS_PER_TOKEN = 4
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+def render(template, **values):
+    """Substitute {NAME} placeholders, leaving any other braces alone"""
+    for name, value in values.items():
+        template = template.replace(f"{{{name}}}", value)
+    return template
+
+
+def compile_system_prompt():
+    """Render the reviewprocess.py templates into one fixed system prompt.
+
+    Placeholders in SYSTEM_INSTRUCTIONS point at sections appended once below
+    it rather than repeating their text. The review rubric is part of the
+    prompt in both modes, so chat and review requests share the whole prefix
+    and OpenAI's automatic prompt caching can reuse it across students.
+    """
+    instructions = render(
+        SYSTEM_INSTRUCTIONS,
+        MODULE_SYLLABUS="the Module Syllabus",
+        MODULE_LEARNING_OBJECTIVES="the Module Learning Objectives",
+        REVIEW_INSTRUCTIONS="When the student asks for a review, score or feedback on a draft, follow the Review Process below."
+    )
+    review = render(REVIEW_INSTRUCTIONS, SCORING_CRITERIA=SCORING_CRITERIA.strip())
+    return "\n\n".join([
+        instructions.strip(),
+        "# Module Syllabus\n" + MODULE_SYLLABUS.strip(),
+        "# Module Learning Objectives\n" + MODULE_LEARNING_OBJECTIVES.strip(),
+        review.strip()
+    ])
+
+
+# Compiled once at import so every request sends a byte-identical prefix
+SYSTEM_PROMPT = compile_system_prompt()
+PROMPT_VERSION = hashlib.sha256(SYSTEM_PROMPT.encode('utf-8')).hexdigest()[:12]
+SYSTEM_MESSAGES = [{"role": "system", "content": SYSTEM_PROMPT}]
+
+# Sent after the history, so it does not break the shared prefix
+REVIEW_MODE_MESSAGE = {
+    "role": "system",
+    "content": "The student is asking for a review. Follow the Review Process and answer in the Review Template exactly."
+}
+
+# Prompts mentioning any of these switch the turn into review mode
+REVIEW_KEYWORDS = ["grade", "score", "review", "assess", "evaluate", "feedback", "rubric"]
+SCORING_KEYWORDS = ["grade", "score", "mark", "rubric"]
+# Whole words only, so "remark", "market" and "benchmark" do not ask for a score
+SCORING_PATTERN = re.compile(rf"\b(?:{'|'.join(SCORING_KEYWORDS)})s?\b", re.IGNORECASE)
+
+
+def is_review_request(prompt):
+    return any(keyword in (prompt or '').lower() for keyword in REVIEW_KEYWORDS)
+
+
+def is_scoring_request(prompt):
+    """True if the student asks for their draft to be scored against the rubric"""
+    return SCORING_PATTERN.search(prompt or '') is not None
+
+
+def estimate_tokens(text):
+    """Estimate the token count of a piece of text without calling the API"""
+    return math.ceil(len(text or '') / CHARS_PER_TOKEN)
+
+
+def message_tokens(message):
+    return estimate_tokens(message.get('content')) + MESSAGE_OVERHEAD_TOKENS
+
+
+def build_context(system_messages, history, prompt, token_budget, tail_messages=()):
+    """Assemble the prompt within a token budget.
+
+    The system messages, the conversation's opening assistant message, any
+    tail messages and the new prompt are always kept; the tail goes just
+    before the prompt. The remaining budget is filled with history
+    from newest to oldest, stopping at the first message that does not fit so
+    the kept history stays contiguous.
+
+    Returns the messages to send and their estimated token count.
+    """
+    history = [{"role": msg["role"], "content": msg["content"]} for msg in history]
+    opening = []
+    if history and history[0]['role'] == 'assistant':
+        opening, history = history[:1], history[1:]
+
+    current = [*tail_messages, {"role": "user", "content": prompt}]
+    used = sum(message_tokens(msg) for msg in system_messages + opening + current)
+
+    kept = []
+    for msg in reversed(history):
+        cost = message_tokens(msg)
+        if used + cost > token_budget:
+            break
+        kept.append(msg)
+        used += cost
+
+    return system_messages + opening + kept[::-1] + current, used
@@ -0,0 +1,115 @@
+# resources.py
+import streamlit as st
+import firebase_admin
+from firebase_admin import credentials, firestore, firestore_async
+from openai import OpenAI, AsyncOpenAI
+import httpx
+
+from asyncbridge import AsyncBridge
+from governor import RateGovernor
+from identity import IdentityClient
+from titles import TitleWorker
+from reviewcache import ReviewCache
+from reviewengine import ReviewEngine
+
+# Defaults, overridable through the [default] section of st.secrets
+OPENAI_TIMEOUT = 60.0          # Seconds to wait for a completion (read timeout)
+OPENAI_CONNECT_TIMEOUT = 5.0   # Seconds to establish a connection
+OPENAI_MAX_RETRIES = 3         # Retries with jittered backoff on 429/5xx/connection errors, by the governor
+OPENAI_RPM = 500               # Requests per minute shared by every completion in the process
+OPENAI_TPM = 200000            # Tokens per minute (prompt plus max_tokens) likewise
+OPENAI_MAX_CONNECTIONS = 50    # Shared across every session in the process
+OPENAI_KEEPALIVE = 20          # Idle connections kept open for reuse
+OPENAI_BASE_URL = None         # API endpoint; None for the OpenAI default
+
+
+def _setting(name, default):
+    return st.secrets["default"].get(name, default)
+
+
+@st.cache_resource(show_spinner=False)
+def get_db():
+    """Process-wide Firestore client, initialising Firebase on first use"""
+    if not firebase_admin._apps:
+        cred = credentials.Certificate(dict(st.secrets["FIREBASE"]))
+        firebase_admin.initialize_app(cred)
+    return firestore.client()
+
+
+def _openai_options():
+    limits = httpx.Limits(
+        max_connections=_setting("OPENAI_MAX_CONNECTIONS", OPENAI_MAX_CONNECTIONS),
+        max_keepalive_connections=_setting("OPENAI_KEEPALIVE", OPENAI_KEEPALIVE)
+    )
+    options = {
+        "api_key": st.secrets["default"]["OPENAI_API_KEY"],
+        "base_url": _setting("OPENAI_BASE_URL", OPENAI_BASE_URL),
+        "timeout": httpx.Timeout(
+            _setting("OPENAI_TIMEOUT", OPENAI_TIMEOUT),
+            connect=_setting("OPENAI_CONNECT_TIMEOUT", OPENAI_CONNECT_TIMEOUT)
+        ),
+        "max_retries": 0  # Retried by the rate governor, which also sees the 429s
+    }
+    return limits, options
+
+
+@st.cache_resource(show_spinner=False)
+def get_identity():
+    """Process-wide Firebase Auth REST client with a pooled HTTP session"""
+    get_db()  # Initialises Firebase, which verifies ID tokens
+    return IdentityClient(st.secrets["default"]["apiKey"])
+
+
+@st.cache_resource(show_spinner=False)
+def get_openai():
+    """Process-wide OpenAI client with a pooled keep-alive HTTP connection"""
+    limits, options = _openai_options()
+    return OpenAI(http_client=httpx.Client(limits=limits), **options)
+
+
+@st.cache_resource(show_spinner=False)
+def get_governor():
+    """Process-wide rate governor that every OpenAI completion call goes through"""
+    return RateGovernor(
+        _setting("OPENAI_RPM", OPENAI_RPM),
+        _setting("OPENAI_TPM", OPENAI_TPM),
+        max_retries=_setting("OPENAI_MAX_RETRIES", OPENAI_MAX_RETRIES)
+    )
+
+
+@st.cache_resource(show_spinner=False)
+def get_async_bridge():
+    """Process-wide event loop thread for async chat turns"""
+    return AsyncBridge()
+
+
+@st.cache_resource(show_spinner=False)
+def get_async_openai():
+    """Async OpenAI client, only to be used on the get_async_bridge() loop"""
+    limits, options = _openai_options()
+    return AsyncOpenAI(http_client=httpx.AsyncClient(limits=limits), **options)
+
+
+@st.cache_resource(show_spinner=False)
+def get_async_db():
+    """Async Firestore client, only to be used on the get_async_bridge() loop"""
+    get_db()  # Initialises Firebase
+    return firestore_async.client()
+
+
+@st.cache_resource(show_spinner=False)
+def get_title_worker():
+    """Process-wide background worker that keeps conversation titles current"""
+    return TitleWorker(get_db(), get_openai(), get_governor())
+
+
+@st.cache_resource(show_spinner=False)
+def get_review_cache():
+    """Process-wide review cache, backed by Firestore"""
+    return ReviewCache(get_db(), "gpt-4o-mini")
+
+
+@st.cache_resource(show_spinner=False)
+def get_review_engine():
+    """Process-wide per-criterion review engine, only to be used on the get_async_bridge() loop"""
+    return ReviewEngine(get_async_openai(), get_governor(), "gpt-4o-mini")
@@ -0,0 +1,99 @@
+# reviewcache.py
+import hashlib
+import logging
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+
+from prompts import PROMPT_VERSION
+
+logger = logging.getLogger(__name__)
+
+MIN_ESSAY_WORDS = 150  # Shorter texts are instructions, not drafts worth caching
+
+
+def normalise_essay(text):
+    """Normalise an essay so whitespace-only edits hit the same cache entry"""
+    return re.sub(r"\s+", " ", unicodedata.normalize("NFC", text or "")).strip()
+
+
+def find_essay(prompt, history):
+    """The draft a review request is about: the prompt itself if it holds the
+    essay, otherwise the latest long user message. None if there is no draft."""
+    for content in [prompt] + [msg.get('content', '') for msg in reversed(history) if msg.get('role') == 'user']:
+        if len((content or '').split()) >= MIN_ESSAY_WORDS:
+            return content
+    return None
+
+
+class ReviewCache:
+    """Two-tier cache of review replies keyed by essay, request and prompt version.
+
+    An in-process LRU answers repeats within the server instantly; the
+    review_cache Firestore collection shares results across restarts. Firestore
+    entries carry expires_at, which a TTL policy on that field can use to
+    evict them; expired entries are also ignored on read. Firestore errors
+    are logged and treated as misses, since the cache is only an optimisation.
+    """
+
+    def __init__(self, db, model, max_entries=256, ttl=timedelta(days=14)):
+        self.collection = db.collection('review_cache')
+        self.model = model
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def key_for(self, essay, request=None):
+        """Key for a review of `essay`. A request sent separately from the essay
+        is part of the key, since "grade it" and "check my thesis" about the
+        same draft get different replies."""
+        text = normalise_essay(essay)
+        request = normalise_essay(request)
+        if request and request != text:
+            text = f"{request}\n{text}"
+        return hashlib.sha256(f"{PROMPT_VERSION}:{self.model}:{text}".encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        """Return the cached review for key, or None"""
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key]
+
+        try:
+            doc = self.collection.document(key).get()
+        except Exception:
+            logger.exception("Review cache lookup failed")
+            return None
+        if not doc.exists:
+            return None
+        data = doc.to_dict()
+        if data.get('expires_at') and data['expires_at'] < datetime.now(timezone.utc):
+            return None
+
+        self._remember(key, data['content'])
+        return data['content']
+
+    def put(self, key, content):
+        self._remember(key, content)
+        now = datetime.now(timezone.utc)
+        try:
+            self.collection.document(key).set({
+                'content': content,
+                'prompt_version': PROMPT_VERSION,
+                'model': self.model,
+                'created_at': now,
+                'expires_at': now + self.ttl
+            })
+        except Exception:
+            logger.exception("Review cache write failed")
+
+    def _remember(self, key, content):
+        with self._lock:
+            self._entries[key] = content
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
@@ -0,0 +1,172 @@
+# reviewengine.py
+import asyncio
+import re
+from functools import partial
+
+from governor import request_tokens
+from metrics import usage_dict
+from prompts import SYSTEM_MESSAGES, estimate_tokens
+from reviewprocess import SCORING_CRITERIA
+
+AREA_MAX_TOKENS = 1200     # Per-area reply: summary, strength and three suggestions
+NOTES_MAX_TOKENS = 600     # Per-chunk evidence notes in the map step
+CHUNK_TOKEN_BUDGET = 6000  # Essays longer than this are reviewed map-reduce style
+
+
+def scoring_areas(criteria=SCORING_CRITERIA):
+    """Split the rubric into (name, max points, criteria text) per assessment area"""
+    areas = []
+    for block in re.split(r"^## ", criteria, flags=re.MULTILINE)[1:]:
+        heading, _, body = block.partition("\n")
+        match = re.match(r"(.+?)\s*\((\d+) points\)", heading.strip())
+        areas.append((match.group(1), int(match.group(2)), body.strip()))
+    return areas
+
+
+def split_essay(essay, token_budget=CHUNK_TOKEN_BUDGET):
+    """Split an essay into paragraph-aligned chunks within the token budget"""
+    chunks, current = [], []
+    for paragraph in re.split(r"\n\s*\n", essay):
+        if current and estimate_tokens("\n\n".join(current + [paragraph])) > token_budget:
+            chunks.append("\n\n".join(current))
+            current = []
+        current.append(paragraph)
+    if current:
+        chunks.append("\n\n".join(current))
+    return chunks
+
+
+class ReviewEngine:
+    """Score each rubric area as an independent completion, in parallel.
+
+    Wall-clock latency is that of the slowest area rather than the sum of
+    all three. Essays over the chunk budget are first condensed into
+    per-area evidence notes for every chunk in parallel (map), and each area is
+    then scored from its notes (reduce). The area sections are merged into
+    the Review Template from reviewprocess.py.
+
+    Calls run as coroutines on the async bridge loop with an AsyncOpenAI
+    client. Every pending call waits in the shared rate governor as a
+    'review' request, so fair queueing across students applies to all of
+    them, not only to those a worker pool happens to be running.
+    """
+
+    def __init__(self, client, governor, model="gpt-4o-mini"):
+        self.client = client
+        self.governor = governor
+        self.model = model
+        self.areas = scoring_areas()
+
+    async def review(self, essay, request=None, on_progress=None, user_id=None, on_wait=None):
+        """Review an essay, calling on_progress(area name, done, total) as areas finish.
+
+        on_wait(position) is called while the area calls wait in the rate
+        governor's queue. Returns the merged review and the summed token usage.
+        """
+        complete = partial(self._complete, user_id=user_id, on_wait=on_wait)
+        chunks = split_essay(essay)
+        usage = {'prompt_tokens': 0, 'completion_tokens': 0, 'cached_tokens': 0}
+
+        if len(chunks) > 1:
+            notes = await self._map_notes(chunks, usage, complete)
+            inputs = {name: "Evidence notes gathered from each part of the essay:\n\n" + "\n\n".join(notes[name])
+                      for name, _, _ in self.areas}
+        else:
+            inputs = {name: essay for name, _, _ in self.areas}
+
+        tasks = [asyncio.ensure_future(self._score_area(area, inputs[area[0]], request, complete))
+                 for area in self.areas]
+        sections = {}
+        try:
+            for done, task in enumerate(asyncio.as_completed(tasks), start=1):
+                name, section, area_usage = await task
+                sections[name] = section
+                self._add_usage(usage, area_usage)
+                if on_progress:
+                    on_progress(name, done, len(tasks))
+        finally:
+            for task in tasks:
+                task.cancel()
+
+        return self._merge(sections), usage
+
+    async def _complete(self, system, user, max_tokens, user_id=None, on_wait=None):
+        messages = SYSTEM_MESSAGES + [
+            {"role": "system", "content": system},
+            {"role": "user", "content": user}
+        ]
+        response = await self.governor.call_async(
+            partial(self.client.chat.completions.create,
+                    model=self.model, messages=messages, temperature=0, max_tokens=max_tokens),
+            'review', request_tokens(messages, max_tokens), user_id, on_wait
+        )
+        return response.choices[0].message.content.strip(), response.usage
+
+    async def _map_notes(self, chunks, usage, complete):
+        """Condense each chunk into evidence notes for every area"""
+        calls, keys = [], []
+        for index, chunk in enumerate(chunks):
+            for name, _, criteria in self.areas:
+                system = (f"You are gathering evidence for the '{name}' assessment area only. "
+                          f"Criteria:\n{criteria}\n\n"
+                          f"This is part {index + 1} of {len(chunks)} of the essay. List the key "
+                          "evidence, strengths, weaknesses and short quotes relevant to these criteria. "
+                          "Do not score.")
+                calls.append(asyncio.ensure_future(complete(system, chunk, NOTES_MAX_TOKENS)))
+                keys.append((name, index))
+
+        try:
+            results = await asyncio.gather(*calls)
+        finally:
+            for call in calls:
+                call.cancel()  # Stop the remaining calls if one failed
+
+        notes = {name: [None] * len(chunks) for name, _, _ in self.areas}
+        for (name, index), (text, chunk_usage) in zip(keys, results):
+            notes[name][index] = f"Part {index + 1}:\n{text}"
+            self._add_usage(usage, chunk_usage)
+        return notes
+
+    async def _score_area(self, area, essay, request, complete):
+        name, max_points, criteria = area
+        system = (f"Review the essay for the '{name}' assessment area only, following the Review Process. "
+                  f"Criteria ({max_points} points):\n{criteria}\n\n"
+                  "Answer with only this section of the Review Template:\n"
+                  f"**{name} ([X]/{max_points}):** [Detailed 2-3 sentence summary of performance in this area]\n"
+                  "   - **Strength:** [Specific example with quote from essay]\n"
+                  "   - **Suggestions for Improvement:**\n"
+                  "     1. [First specific, actionable suggestion with example]\n"
+                  "     2. [Second specific, actionable suggestion with example]\n"
+                  "     3. [Third specific, actionable suggestion with example]")
+        if request:
+            system += f"\n\nThe student's request: {request}"
+        section, area_usage = await complete(system, essay, AREA_MAX_TOKENS)
+        return name, section, area_usage
+
+    def _merge(self, sections):
+        """Assemble the area sections into the Review Template"""
+        total = 0
+        parts = []
+        for number, (name, max_points, _) in enumerate(self.areas, start=1):
+            section = sections[name]
+            match = re.search(rf"\(\[?(\d+(?:\.\d+)?)\]?\s*/\s*{max_points}\)", section)
+            if match and total is not None:
+                total += float(match.group(1))
+            else:
+                total = None
+            parts.append(f"{number}. {section}")
+
+        score = f"{total:g}" if total is not None else "?"
+        return "\n".join([
+            "# Estimated Grade",
+            f"**Total Score: [{score}/100]**",
+            "",
+            "# Assessment Areas:",
+            "\n\n".join(parts),
+            "",
+            "Is there any specific area you would like me to elaborate further?"
+        ])
+
+    def _add_usage(self, total, usage):
+        for field, count in (usage_dict(usage) or {}).items():
+            total[field] += count
@@ -0,0 +1,131 @@
+# rollups.py
+from datetime import datetime
+
+import pandas as pd
+from firebase_admin import firestore
+
+# Per-user, per-day activity lives in user_rollups/{day}_{user_id}. Each saved
+# message adds to it in the same batch, so cohort analytics read one document
+# per active student per day instead of every message.
+#
+# The response gap is the time from the previous message to a student's
+# message. Gaps are kept as a histogram in response_gaps, keyed by the
+# bucket's upper bound in seconds, and the median is read from it.
+GAP_BUCKETS = [10, 30, 60, 120, 300, 600, 1800, 3600]
+GAP_LABELS = [f"le_{bound}" for bound in GAP_BUCKETS] + ["over"]
+GAP_BOUNDS = dict(zip(GAP_LABELS, GAP_BUCKETS + [float('inf')]))
+
+
+def rollup_ref(db, user_id, day):
+    return db.collection('user_rollups').document(f"{day}_{user_id}")
+
+
+def gap_label(seconds):
+    for label, bound in GAP_BOUNDS.items():
+        if seconds <= bound:
+            return label
+
+
+def add_to_rollup(batch, db, user_id, day, messages, previous_at=None, reviews=0):
+    """Add saved messages to the user's rollup for `day` in `batch`.
+
+    `previous_at` is the timestamp of the message before them in the
+    conversation. Returns the timestamp of the last message, for the next call.
+    """
+    update = {
+        'user_id': user_id,
+        'day': day,
+        'messages': firestore.Increment(len(messages)),
+        'reviews_requested': firestore.Increment(reviews),
+        'updated_at': firestore.SERVER_TIMESTAMP
+    }
+    counts = {'user_messages': 0, 'user_words': 0, 'assistant_words': 0, 'gap_count': 0, 'gap_seconds': 0}
+    gaps = {}
+    for message in messages:
+        words = len((message.get('content') or '').split())
+        timestamp = message.get('timestamp')
+        if message.get('role') == 'user':
+            counts['user_messages'] += 1
+            counts['user_words'] += words
+            if isinstance(timestamp, datetime) and isinstance(previous_at, datetime):
+                gap = (timestamp - previous_at).total_seconds()
+                if gap >= 0:
+                    counts['gap_count'] += 1
+                    counts['gap_seconds'] += round(gap)
+                    gaps[gap_label(gap)] = gaps.get(gap_label(gap), 0) + 1
+        else:
+            counts['assistant_words'] += words
+        if isinstance(timestamp, datetime):
+            previous_at = timestamp
+
+    update.update({field: firestore.Increment(value) for field, value in counts.items()})
+    if gaps:
+        update['response_gaps'] = {label: firestore.Increment(count) for label, count in gaps.items()}
+    batch.set(rollup_ref(db, user_id, day), update, merge=True)
+    return previous_at
+
+
+def message_frame(messages, tz):
+    """Messages as a DataFrame on real timestamps, with word counts and gaps.
+
+    `messages` are message dicts, optionally with user_id and conversation_id.
+    gap_seconds is the time since the previous message of the same
+    conversation, so it is correct across midnight and across days.
+    """
+    frame = pd.DataFrame(list(messages))
+    for column in ('user_id', 'conversation_id', 'role', 'content', 'timestamp'):
+        if column not in frame:
+            frame[column] = None
+    frame['timestamp'] = pd.to_datetime(frame['timestamp'], utc=True).dt.tz_convert(tz)
+    frame = frame.sort_values(['conversation_id', 'timestamp'], kind='stable', na_position='last')
+    frame['words'] = frame['content'].fillna('').str.split().str.len()
+    frame['gap_seconds'] = frame.groupby('conversation_id', dropna=False)['timestamp'].diff().dt.total_seconds()
+    return frame.reset_index(drop=True)
+
+
+def rollups_from_messages(frame, is_review_request):
+    """Rollup documents for every (user_id, day) in a message_frame"""
+    frame = frame.dropna(subset=['timestamp', 'user_id']).copy()
+    is_user = frame['role'].eq('user')
+    gaps = frame['gap_seconds'].where(is_user & frame['gap_seconds'].ge(0))
+    frame['day'] = frame['timestamp'].dt.strftime('%Y-%m-%d')
+    frame['user_message'] = is_user.astype(int)
+    frame['user_words'] = frame['words'].where(is_user, 0)
+    frame['assistant_words'] = frame['words'].where(~is_user, 0)
+    frame['review'] = (is_user & frame['content'].map(is_review_request)).astype(int)
+    frame['gap'] = gaps
+    frame['gap_label'] = pd.cut(gaps, [-1] + GAP_BUCKETS + [float('inf')], labels=GAP_LABELS)
+
+    keys = ['user_id', 'day']
+    totals = frame.groupby(keys).agg(
+        messages=('role', 'size'),
+        user_messages=('user_message', 'sum'),
+        user_words=('user_words', 'sum'),
+        assistant_words=('assistant_words', 'sum'),
+        reviews_requested=('review', 'sum'),
+        gap_count=('gap', 'count'),
+        gap_seconds=('gap', 'sum')
+    )
+    histogram = frame.dropna(subset=['gap_label'])\
+        .groupby(keys + ['gap_label'], observed=True).size()\
+        .unstack(fill_value=0)
+
+    for (user_id, day), row in totals.iterrows():
+        doc = {field: int(round(value)) for field, value in row.items()}
+        doc.update({'user_id': user_id, 'day': day})
+        if (user_id, day) in histogram.index:
+            doc['response_gaps'] = {label: int(count) for label, count in histogram.loc[(user_id, day)].items() if count}
+        yield doc
+
+
+def median_gap(rollups):
+    """Approximate median response gap per row of json_normalize'd rollups.
+
+    The median is the upper bound of the bucket holding the middle gap.
+    """
+    columns = [f"response_gaps.{label}" for label in GAP_LABELS]
+    counts = rollups.reindex(columns=columns).fillna(0)
+    total = counts.sum(axis=1)
+    reached = counts.cumsum(axis=1).ge(total / 2, axis=0) & total.gt(0).to_numpy()[:, None]
+    labels = reached.idxmax(axis=1).where(reached.any(axis=1))
+    return labels.str.removeprefix("response_gaps.").map(GAP_BOUNDS)
@@ -0,0 +1,236 @@
+# store.py
+import random
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from firebase_admin import firestore
+
+from prompts import is_review_request
+from rollups import add_to_rollup, message_frame, rollup_ref, rollups_from_messages
+
+# Conversation documents keep a running message count and the last few
+# message snippets so titles and counts never need a subcollection scan.
+RECENT_MESSAGES = 5
+SNIPPET_LENGTH = 300
+
+# Dashboard counters live in stats/{totals|daily_YYYY-MM-DD}/shards/{n}; writes
+# pick a random shard so a busy class stays under the per-document write rate.
+COUNTER_SHARDS = 10
+
+MAX_BATCH_WRITES = 500   # Firestore's limit on writes per commit
+DELETE_WORKERS = 8       # Conversations deleted concurrently
+
+
+def snippet(content):
+    """Shorten message content for the conversation's recent_messages buffer"""
+    return (content or '')[:SNIPPET_LENGTH]
+
+
+def _turn_batch(db, conversation_id, user_id, messages, stats=None, title=None, day=None, is_review=False):
+    """Build the batch for persist_turn, returning it with the conversation id and new stats"""
+    stats = stats or {'message_count': 0, 'recent_messages': []}
+    count = stats['message_count'] + len(messages)
+    recent = (stats['recent_messages'] + [snippet(msg.get('content')) for msg in messages])[-RECENT_MESSAGES:]
+
+    batch = db.batch()
+    if conversation_id:
+        conv_ref = db.collection('conversations').document(conversation_id)
+        batch.update(conv_ref, {
+            'updated_at': firestore.SERVER_TIMESTAMP,
+            'message_count': count if stats.get('backfill') else firestore.Increment(len(messages)),
+            'recent_messages': recent
+        })
+    else:
+        conv_ref = db.collection('conversations').document()
+        batch.set(conv_ref, {
+            'user_id': user_id,
+            'created_at': firestore.SERVER_TIMESTAMP,
+            'updated_at': firestore.SERVER_TIMESTAMP,
+            'title': title,
+            'status': 'active',
+            'message_count': count,
+            'recent_messages': recent
+        })
+
+    for message in messages:
+        batch.set(conv_ref.collection('messages').document(), message)
+
+    # Denormalised for the admin user table
+    batch.set(db.collection('users').document(user_id),
+              {'last_active_at': firestore.SERVER_TIMESTAMP}, merge=True)
+    _bump_counters(batch, db, day, len(messages), 1 if is_review else 0)
+    last_message_at = stats.get('last_message_at')
+    if day:
+        last_message_at = add_to_rollup(batch, db, user_id, day, messages, last_message_at, 1 if is_review else 0)
+
+    return batch, conv_ref.id, {'message_count': count, 'recent_messages': recent, 'last_message_at': last_message_at}
+
+
+def persist_turn(db, conversation_id, user_id, messages, stats=None, title=None, day=None, is_review=False):
+    """Write a turn's messages and the conversation metadata in one batched commit.
+
+    `stats` holds the message_count and recent_messages the caller last saw for
+    the conversation (None for a new one), so the update needs no read first.
+    Stats flagged 'backfill' come from a conversation without a stored counter,
+    whose count is then written outright instead of incremented.
+
+    The user's last_active_at, the dashboard counters and the user's rollup
+    for `day` are updated in the same batch. The stats also carry the last
+    message's timestamp, from which the rollup measures response gaps.
+
+    Returns the conversation id and its stats after the write.
+    """
+    batch, conversation_id, stats = _turn_batch(db, conversation_id, user_id, messages, stats, title, day, is_review)
+    batch.commit()
+    return conversation_id, stats
+
+
+async def persist_turn_async(db, conversation_id, user_id, messages, stats=None, title=None, day=None, is_review=False):
+    """persist_turn for an async Firestore client"""
+    batch, conversation_id, stats = _turn_batch(db, conversation_id, user_id, messages, stats, title, day, is_review)
+    await batch.commit()
+    return conversation_id, stats
+
+
+def _bump_counters(batch, db, day, messages, reviews):
+    shard = str(random.randrange(COUNTER_SHARDS))
+    counters = ['totals'] + ([f'daily_{day}'] if day else [])
+    for counter in counters:
+        batch.set(db.collection('stats').document(counter).collection('shards').document(shard), {
+            'messages': firestore.Increment(messages),
+            'reviews_requested': firestore.Increment(reviews)
+        }, merge=True)
+
+
+def read_counter(db, counter, field):
+    """Sum a sharded dashboard counter server-side"""
+    result = db.collection('stats').document(counter).collection('shards').sum(field).get()
+    return int(result[0][0].value or 0)
+
+
+def conversation_stats(conv_data, messages):
+    """Stats for persist_turn from a conversation document and its loaded messages"""
+    if 'message_count' in conv_data and 'recent_messages' in conv_data:
+        return {'message_count': conv_data['message_count'], 'recent_messages': conv_data['recent_messages'],
+                'last_message_at': conv_data.get('updated_at')}
+    return {
+        'message_count': len(messages),
+        'recent_messages': [snippet(msg.get('content')) for msg in messages[-RECENT_MESSAGES:]],
+        'last_message_at': conv_data.get('updated_at'),
+        'backfill': True
+    }
+
+
+def backfill_conversation_stats(db):
+    """Fill message_count and recent_messages on conversations missing them.
+
+    Returns the number of conversations updated.
+    """
+    updated = 0
+    for conv in db.collection('conversations').stream():
+        conv_data = conv.to_dict()
+        if 'message_count' in conv_data and 'recent_messages' in conv_data:
+            continue
+
+        messages_ref = conv.reference.collection('messages')
+        count = messages_ref.count().get()[0][0].value
+        latest = messages_ref.order_by('timestamp', direction=firestore.Query.DESCENDING)\
+                             .limit(RECENT_MESSAGES)\
+                             .stream()
+        recent = [snippet(msg.to_dict().get('content')) for msg in latest][::-1]
+
+        conv.reference.update({'message_count': count, 'recent_messages': recent})
+        updated += 1
+    return updated
+
+
+def backfill_last_active(db):
+    """Fill last_active_at on user documents from their latest conversation.
+
+    Returns the number of users updated.
+    """
+    updated = 0
+    for user in db.collection('users').stream():
+        if 'last_active_at' in user.to_dict():
+            continue
+
+        latest = list(db.collection('conversations')
+                        .where('user_id', '==', user.id)
+                        .order_by('updated_at', direction=firestore.Query.DESCENDING)
+                        .limit(1)
+                        .stream())
+        if not latest:
+            continue
+
+        user.reference.update({'last_active_at': latest[0].get('updated_at')})
+        updated += 1
+    return updated
+
+
+def backfill_rollups(db, tz, batch_size=MAX_BATCH_WRITES):
+    """Rebuild every user_rollups document from the stored messages.
+
+    Messages are read once and aggregated with pandas on their real
+    timestamps. Existing rollups are overwritten, so turns saved while this
+    runs may be counted twice or not at all. Returns the number of rollups
+    written.
+    """
+    rows = []
+    for conv in db.collection('conversations').select(['user_id']).stream():
+        user_id = conv.to_dict().get('user_id')
+        for msg in conv.reference.collection('messages').select(['role', 'content', 'timestamp']).stream():
+            rows.append({**msg.to_dict(), 'user_id': user_id, 'conversation_id': conv.id})
+    if not rows:
+        return 0
+
+    written = 0
+    batch = db.batch()
+    for doc in rollups_from_messages(message_frame(rows, tz), is_review_request):
+        batch.set(rollup_ref(db, doc['user_id'], doc['day']), {**doc, 'updated_at': firestore.SERVER_TIMESTAMP})
+        written += 1
+        if written % batch_size == 0:
+            batch.commit()
+            batch = db.batch()
+    batch.commit()
+    return written
+
+
+def delete_conversation_tree(db, conversation_id, batch_size=MAX_BATCH_WRITES):
+    """Delete a conversation and its messages with batched commits.
+
+    Messages are deleted a page at a time; the conversation document goes in
+    the final commit. Returns the number of messages deleted.
+    """
+    conv_ref = db.collection('conversations').document(conversation_id)
+    messages_ref = conv_ref.collection('messages')
+    deleted = 0
+    while True:
+        docs = list(messages_ref.select([]).limit(batch_size).stream())
+        batch = db.batch()
+        for doc in docs:
+            batch.delete(doc.reference)
+        if len(docs) < batch_size:
+            batch.delete(conv_ref)
+            batch.commit()
+            return deleted + len(docs)
+        batch.commit()
+        deleted += len(docs)
+
+
+def delete_conversations(db, conversation_ids, on_progress=None, max_workers=DELETE_WORKERS):
+    """Delete conversations concurrently with bounded parallelism.
+
+    `on_progress(done, total, messages_deleted)` is called from the calling
+    thread after each conversation finishes. Returns the number of
+    conversations and messages deleted.
+    """
+    conversation_ids = list(conversation_ids)
+    total = len(conversation_ids)
+    done = messages = 0
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = [pool.submit(delete_conversation_tree, db, conv_id) for conv_id in conversation_ids]
+        for future in as_completed(futures):
+            messages += future.result()
+            done += 1
+            if on_progress:
+                on_progress(done, total, messages)
+    return {'conversations': done, 'messages': messages}
@@ -0,0 +1,119 @@
+# titles.py
+import logging
+import threading
+import time
+from collections import OrderedDict
+from functools import partial
+
+from google.api_core.exceptions import NotFound
+
+from governor import request_tokens
+from metrics import StageTimer, record_metrics, usage_dict
+
+logger = logging.getLogger(__name__)
+
+
+class TitleWorker:
+    """Keep conversation titles up to date from a background thread.
+
+    Updates are keyed by conversation, so a burst of saves to the same
+    conversation coalesces into one job that runs once the conversation has
+    been quiet for `debounce` seconds. The 2-3 word summary is only
+    regenerated on the first turn and then every `regenerate_every` messages;
+    in between only the message count in the title is refreshed. Each job
+    records its title generation and write time in turn_metrics. Title
+    completions are the lowest priority in the shared rate governor.
+
+    Summaries of the `max_summaries` most recently updated conversations are
+    kept in memory; older ones are read back from the conversation when it
+    is next updated.
+    """
+
+    def __init__(self, db, client, governor, debounce=2.0, regenerate_every=10, max_summaries=1000):
+        self.db = db
+        self.client = client
+        self.governor = governor
+        self.debounce = debounce
+        self.regenerate_every = regenerate_every
+        self.max_summaries = max_summaries
+        self._pending = {}    # conversation_id -> (due time, job)
+        self._summaries = OrderedDict()  # conversation_id -> (summary, message count when generated), LRU
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name="title-worker", daemon=True)
+        self._thread.start()
+
+    def submit(self, conversation_id, count, date_label, context, user_id=None):
+        """Queue a title update, replacing any pending one for the conversation"""
+        job = {"count": count, "date_label": date_label, "context": context, "user_id": user_id}
+        with self._cond:
+            self._pending[conversation_id] = (time.monotonic() + self.debounce, job)
+            self._cond.notify()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+                conversation_id, (due, job) = min(self._pending.items(), key=lambda item: item[1][0])
+                delay = due - time.monotonic()
+                if delay > 0:
+                    self._cond.wait(delay)
+                    continue
+                del self._pending[conversation_id]
+
+            try:
+                self._update_title(conversation_id, **job)
+            except NotFound:
+                self._summaries.pop(conversation_id, None)  # Deleted in the meantime
+            except Exception:
+                logger.exception("Title update failed for conversation %s", conversation_id)
+
+    def _needs_summary(self, conv_ref, count):
+        """Return the summary to reuse, or None if it should be regenerated"""
+        if conv_ref.id in self._summaries:
+            self._summaries.move_to_end(conv_ref.id)
+        else:
+            conv_data = conv_ref.get(['summary', 'summary_count']).to_dict() or {}
+            if conv_data.get('summary'):
+                self._remember(conv_ref.id, conv_data['summary'], conv_data.get('summary_count', 0))
+
+        summary, summary_count = self._summaries.get(conv_ref.id, (None, 0))
+        if summary is None or count - summary_count >= self.regenerate_every:
+            return None
+        return summary
+
+    def _remember(self, conversation_id, summary, count):
+        # Only the worker thread touches _summaries, so no lock is needed
+        self._summaries[conversation_id] = (summary, count)
+        self._summaries.move_to_end(conversation_id)
+        while len(self._summaries) > self.max_summaries:
+            self._summaries.popitem(last=False)
+
+    def _update_title(self, conversation_id, count, date_label, context, user_id=None):
+        timer = StageTimer()
+        usage = None
+        conv_ref = self.db.collection('conversations').document(conversation_id)
+        summary = self._needs_summary(conv_ref, count)
+
+        update = {}
+        if summary is None:
+            messages = [
+                {"role": "system", "content": "Create a 2-3 word title for this conversation."},
+                {"role": "user", "content": context}
+            ]
+            with timer.span('title_llm'):
+                response = self.governor.call(
+                    partial(self.client.chat.completions.create,
+                            model="gpt-4o-mini", messages=messages, temperature=0.3, max_tokens=10),
+                    'title', request_tokens(messages, 10), user_id
+                )
+            summary = response.choices[0].message.content.strip()
+            usage = response.usage
+            self._remember(conversation_id, summary, count)
+            update = {'summary': summary, 'summary_count': count}
+
+        update['title'] = f"{date_label} • {summary} [{count}📝]"
+        with timer.span('title_write'):
+            conv_ref.update(update)
+
+        record_metrics(self.db, 'title', user_id, conversation_id, timer.finish(), usage_dict(usage))